@@ -6,14 +6,34 @@ This script analyzes smart contract code quality based on various metrics
 including test coverage, code complexity, documentation, and gas efficiency.
 """
 
+import argparse
 import os
 import re
-import json
 import sys
-from pathlib import Path
 
-def calculate_code_quality_score():
-    """Calculate overall code quality score"""
+from ci_artifacts import get_cache
+from ci_metrics import enable_from_env, instrumented
+from ci_profile import profiled
+
+WEIGHTS = {
+    'test_coverage': 0.3,
+    'documentation': 0.15,
+    'code_complexity': 0.15,
+    'gas_efficiency': 0.2,
+    'natspec_coverage': 0.1,
+    'contract_size': 0.1,
+    'test_health': 0.1
+}
+
+_FUNCTION_HEADER = re.compile(r'\s*function\s+\w+\s*\(')
+# Comments tools read between a function and its NatSpec
+_LINT_DIRECTIVE = re.compile(r'\s*//\s*(?:slither-disable|solhint-disable|forgefmt:)')
+
+@instrumented('quality')
+def calculate_code_quality_score(cache=None, breakdown=None):
+    """Calculate overall code quality score; per-metric scores are copied into `breakdown` if given"""
+
+    cache = cache or get_cache()
 
     score = 100
     metrics = {
@@ -21,229 +41,290 @@ def calculate_code_quality_score():
         'documentation': 0,
         'code_complexity': 0,
         'gas_efficiency': 0,
-        'natspec_coverage': 0
+        'natspec_coverage': 0,
+        'contract_size': 0,
+        'test_health': None
     }
 
     try:
         # 1. Test Coverage Analysis
-        test_score = analyze_test_coverage()
+        test_score = analyze_test_coverage(cache)
         metrics['test_coverage'] = test_score
 
         # 2. Documentation Analysis
-        docs_score = analyze_documentation()
+        docs_score = analyze_documentation(cache)
         metrics['documentation'] = docs_score
 
         # 3. Code Complexity Analysis
-        complexity_score = analyze_code_complexity()
+        complexity_score = analyze_code_complexity(cache)
         metrics['code_complexity'] = complexity_score
 
         # 4. Gas Efficiency Analysis
-        gas_score = analyze_gas_efficiency()
+        gas_score = analyze_gas_efficiency(cache)
         metrics['gas_efficiency'] = gas_score
 
         # 5. NatSpec Coverage Analysis
-        natspec_score = analyze_natspec_coverage()
+        natspec_score = analyze_natspec_coverage(cache)
         metrics['natspec_coverage'] = natspec_score
 
-        # Calculate weighted average
-        weights = {
-            'test_coverage': 0.3,
-            'documentation': 0.2,
-            'code_complexity': 0.2,
-            'gas_efficiency': 0.2,
-            'natspec_coverage': 0.1
-        }
+        # 6. Contract Size Analysis
+        size_score = analyze_contract_size(cache)
+        metrics['contract_size'] = size_score
 
-        final_score = sum(
-            metrics[metric] * weights[metric]
-            for metric in weights
-        )
+        # 7. Test Health Analysis (only when forge test results were saved)
+        metrics['test_health'] = analyze_test_health(cache)
 
-        final_score = round(final_score, 0)
+        # Calculate weighted average
+        final_score = weighted_score(metrics)
 
     except Exception as e:
         print(f"Error calculating quality score: {e}", file=sys.stderr)
         final_score = 75  # Default score
 
+    if breakdown is not None:
+        breakdown.update(metrics)
+
     return final_score
 
-def analyze_test_coverage():
+def weighted_score(metrics):
+    """Weighted average of the per-metric scores, leaving out metrics without data"""
+    weights = {metric: weight for metric, weight in WEIGHTS.items() if metrics.get(metric) is not None}
+    return round(sum(metrics[metric] * weight for metric, weight in weights.items()) / sum(weights.values()), 0)
+
+@instrumented('quality')
+def analyze_test_coverage(cache=None):
     """Analyze test coverage from Foundry output"""
+    cache = cache or get_cache()
     try:
-        # Look for coverage.lcov file
-        lcov_files = list(Path('.').rglob('coverage.lcov'))
-        if not lcov_files:
+        from lcov import find_lcov, read_lcov
+
+        # Look for the lcov file of forge coverage
+        lcov_file = find_lcov(cache)
+        if lcov_file is None:
             return 80  # Default if no coverage file found
 
-        # Parse coverage file (simplified)
-        coverage_score = 85  # Placeholder - real implementation would parse lcov
-        return min(100, coverage_score)
+        # Line coverage of the contracts in src
+        sources = {path.resolve() for path in cache.sources('src', '.sol')}
+        lines_found = lines_hit = 0
+        for record in read_lcov(lcov_file):
+            if (cache.root / record.path).resolve() in sources:
+                lines_found += record.lines_found
+                lines_hit += record.lines_hit
+
+        if lines_found == 0:
+            return 80
+
+        coverage_score = lines_hit / lines_found * 100
+        return min(100, round(coverage_score))
 
     except:
         return 75
 
-def analyze_documentation():
+@instrumented('quality')
+def analyze_documentation(cache=None):
     """Analyze documentation quality"""
+    cache = cache or get_cache()
     try:
-        score = 100
-        src_path = Path('src')
+        src_path = cache.root / 'src'
 
         if not src_path.exists():
             return 70
 
-        # Check for README files
-        readme_files = list(Path('.').rglob('README.md'))
-        if len(readme_files) < 2:  # Expect at least main + contracts README
-            score -= 10
-
-        # Check for documentation directory
-        if not Path('docs').exists():
-            score -= 10
+        score = documentation_base(cache)
 
         # Check for inline documentation density
-        solidity_files = list(src_path.rglob('*.sol'))
+        solidity_files = cache.sources('src', '.sol')
         if solidity_files:
             total_lines = 0
             commented_lines = 0
 
             for sol_file in solidity_files:
                 try:
-                    content = sol_file.read_text()
-                    lines = content.split('\n')
-                    total_lines += len(lines)
-                    commented_lines += len([
-                        line for line in lines
-                        if line.strip().startswith('//') or
-                           line.strip().startswith('/*') or
-                           '/*' in line
-                    ])
+                    lines, commented = comment_counts(cache.read_text(sol_file))
+                    total_lines += lines
+                    commented_lines += commented
                 except:
                     continue
 
-            if total_lines > 0:
-                comment_ratio = (commented_lines / total_lines) * 100
-                if comment_ratio < 10:
-                    score -= 15
-                elif comment_ratio < 20:
-                    score -= 5
+            for bundle in cache.dependency_bundles().values():
+                total_lines += bundle['quality']['lines']
+                commented_lines += bundle['quality']['commented_lines']
+
+            score -= comment_penalty(total_lines, commented_lines)
 
         return max(0, score)
 
     except:
         return 70
 
-def analyze_code_complexity():
+def documentation_base(cache):
+    """Documentation score before the inline comment density is taken into account"""
+    score = 100
+
+    # Check for README files
+    readme_files = cache.find('README.md')
+    if len(readme_files) < 2:  # Expect at least main + contracts README
+        score -= 10
+
+    # Check for documentation directory
+    if not (cache.root / 'docs').exists():
+        score -= 10
+
+    return score
+
+def comment_counts(content):
+    """Total and commented line counts of one source file"""
+    lines = content.split('\n')
+    commented = len([
+        line for line in lines
+        if line.strip().startswith('//') or
+           line.strip().startswith('/*') or
+           '/*' in line
+    ])
+    return len(lines), commented
+
+def comment_penalty(total_lines, commented_lines):
+    """Points lost for a low ratio of commented lines"""
+    if total_lines > 0:
+        comment_ratio = (commented_lines / total_lines) * 100
+        if comment_ratio < 10:
+            return 15
+        elif comment_ratio < 20:
+            return 5
+    return 0
+
+@instrumented('quality')
+def analyze_code_complexity(cache=None):
     """Analyze code complexity"""
+    cache = cache or get_cache()
     try:
         score = 100
-        src_path = Path('src')
+        src_path = cache.root / 'src'
 
         if not src_path.exists():
             return 80
 
-        solidity_files = list(src_path.rglob('*.sol'))
+        solidity_files = cache.sources('src', '.sol')
         total_functions = 0
         complex_functions = 0
 
         for sol_file in solidity_files:
             try:
-                content = sol_file.read_text()
-
-                # Count functions
-                function_matches = re.findall(r'\bfunction\s+\w+', content)
-                total_functions += len(function_matches)
-
-                # Count complex functions (with multiple control flows)
-                complex_matches = re.findall(
-                    r'function\s+\w+[^{]*{[^}]*\bif\b[^}]*\belse\b[^}]*\bif\b',
-                    content,
-                    re.DOTALL
-                )
-                complex_functions += len(complex_matches)
-
-                # Check for other complexity indicators
-                if 'for' in content and 'if' in content and content.count('for') > 5:
-                    complex_functions += 1
-
+                functions, complex_ = complexity_counts(cache.read_text(sol_file))
+                total_functions += functions
+                complex_functions += complex_
             except:
                 continue
 
-        if total_functions > 0:
-            complexity_ratio = (complex_functions / total_functions) * 100
-            if complexity_ratio > 30:
-                score -= 20
-            elif complexity_ratio > 20:
-                score -= 10
-            elif complexity_ratio > 10:
-                score -= 5
+        for bundle in cache.dependency_bundles().values():
+            total_functions += bundle['quality']['functions']
+            complex_functions += bundle['quality']['complex_functions']
+
+        score -= complexity_penalty(total_functions, complex_functions)
 
         return max(0, score)
 
     except:
         return 80
 
-def analyze_gas_efficiency():
-    """Analyze gas efficiency from gas reports"""
+def complexity_counts(content):
+    """Function and complex function counts of one source file"""
+    # Count functions
+    function_matches = re.findall(r'\bfunction\s+\w+', content)
+
+    # Count complex functions (with multiple control flows)
+    complex_matches = re.findall(
+        r'function\s+\w+[^{]*{[^}]*\bif\b[^}]*\belse\b[^}]*\bif\b',
+        content,
+        re.DOTALL
+    )
+    complex_functions = len(complex_matches)
+
+    # Check for other complexity indicators
+    if 'for' in content and 'if' in content and content.count('for') > 5:
+        complex_functions += 1
+
+    return len(function_matches), complex_functions
+
+def complexity_penalty(total_functions, complex_functions):
+    """Points lost for a high ratio of complex functions"""
+    if total_functions > 0:
+        complexity_ratio = (complex_functions / total_functions) * 100
+        if complexity_ratio > 30:
+            return 20
+        elif complexity_ratio > 20:
+            return 10
+        elif complexity_ratio > 10:
+            return 5
+    return 0
+
+@instrumented('quality')
+def analyze_gas_efficiency(cache=None):
+    """Analyze gas efficiency from static hotspots and storage packing"""
+    cache = cache or get_cache()
     try:
-        # Look for gas report files
-        gas_files = list(Path('.').rglob('gas-report.txt')) + list(Path('.').rglob('gas-snapshot.md'))
-
-        if not gas_files:
-            return 85  # Default if no gas report found
-
-        score = 100
+        scores = [
+            score for score in (analyze_gas_hotspots(cache), analyze_storage_packing(cache))
+            if score is not None
+        ]
 
-        # Simple heuristic: check for warnings in gas reports
-        for gas_file in gas_files:
-            try:
-                content = gas_file.read_text()
-
-                # Look for high gas consumption indicators
-                if 'high gas usage' in content.lower() or 'expensive' in content.lower():
-                    score -= 10
+        if not scores:
+            return 85  # Default if there are neither sources nor storage layouts
 
-                # Look for optimization opportunities
-                if 'optimization' in content.lower():
-                    score += 5
-
-            except:
-                continue
-
-        return max(0, min(100, score))
+        return round(sum(scores) / len(scores))
 
     except:
         return 80
 
-def analyze_natspec_coverage():
+@instrumented('quality')
+def analyze_gas_hotspots(cache=None):
+    """Analyze gas anti-patterns in the Solidity sources, or None if there are none"""
+    cache = cache or get_cache()
+    from gas_hotspots import detect_hotspots, hotspot_score
+
+    findings, function_count = detect_hotspots(cache)
+    bundles = cache.dependency_bundles().values()
+    return hotspot_score(
+        findings,
+        function_count + sum(bundle['quality']['hotspot_functions'] for bundle in bundles),
+        sum(bundle['quality']['hotspot_penalty'] for bundle in bundles),
+    )
+
+@instrumented('quality')
+def analyze_storage_packing(cache=None):
+    """Analyze storage slot packing from forge storage layouts, or None if there are none"""
+    cache = cache or get_cache()
+    from storage_layout import analyze_storage_packing as analyze_layouts, packing_score
+
+    return packing_score(analyze_layouts(cache))
+
+@instrumented('quality')
+def analyze_natspec_coverage(cache=None):
     """Analyze NatSpec documentation coverage"""
+    cache = cache or get_cache()
     try:
         score = 100
-        src_path = Path('src')
+        src_path = cache.root / 'src'
 
         if not src_path.exists():
             return 75
 
-        solidity_files = list(src_path.rglob('*.sol'))
+        solidity_files = cache.sources('src', '.sol')
         total_functions = 0
         documented_functions = 0
 
         for sol_file in solidity_files:
             try:
-                content = sol_file.read_text()
-
-                # Find all function definitions
-                function_pattern = r'(?:///\s*.*\s*)*\s*function\s+(\w+)\s*\([^)]*\)\s*(?:public|external|internal|private)?\s*(?:view|pure|payable)?\s*(?:returns\s*\([^)]*\))?\s*{'
-                functions = re.finditer(function_pattern, content, re.MULTILINE | re.DOTALL)
-
-                for match in functions:
-                    total_functions += 1
-                    # Check if function has NatSpec documentation
-                    if '///' in content[:match.start()].split('\n')[-3:]:
-                        documented_functions += 1
-
+                functions, documented = natspec_counts(cache.read_text(sol_file))
+                total_functions += functions
+                documented_functions += documented
             except:
                 continue
 
+        for bundle in cache.dependency_bundles().values():
+            total_functions += bundle['quality']['natspec_functions']
+            documented_functions += bundle['quality']['documented_functions']
+
         if total_functions > 0:
             coverage_ratio = (documented_functions / total_functions) * 100
             score = coverage_ratio
@@ -253,10 +334,103 @@ def analyze_natspec_coverage():
     except:
         return 75
 
+def natspec_counts(content):
+    """Function and NatSpec-documented function counts of one source file
+
+    A function is documented if its header is directly preceded by a `///`
+    line or a `/** ... */` block, ignoring blank lines and linter directives.
+    """
+    lines = content.splitlines()
+    total_functions = 0
+    documented_functions = 0
+
+    for i, line in enumerate(lines):
+        if not _FUNCTION_HEADER.match(line):
+            continue
+        total_functions += 1
+
+        j = i - 1
+        while j >= 0 and (not lines[j].strip() or _LINT_DIRECTIVE.match(lines[j])):
+            j -= 1
+        if j < 0:
+            continue
+        previous = lines[j].strip()
+        if previous.startswith('///'):
+            documented_functions += 1
+        elif previous.endswith('*/'):
+            # Find the opening of the block comment
+            while j >= 0 and '/*' not in lines[j]:
+                j -= 1
+            if j >= 0 and lines[j].lstrip().startswith('/**'):
+                documented_functions += 1
+
+    return total_functions, documented_functions
+
+@instrumented('quality')
+def analyze_contract_size(cache=None):
+    """Analyze deployed bytecode size against the EIP-170 limit"""
+    cache = cache or get_cache()
+    try:
+        from forge_artifacts import EIP170_LIMIT
+
+        # Only score our own contracts, not tests, scripts or dependencies
+        sources = {path.name for path in cache.sources('src', '.sol')}
+        sizes = [
+            entry['deployed_size']
+            for entry in cache.forge_artifacts().entries().values()
+            if entry['source'] in sources and entry['deployed_size'] > 0
+        ]
+
+        if not sizes:
+            return 85  # Default if the contracts have not been built
+
+        score = 100
+        for size in sizes:
+            if size > EIP170_LIMIT:
+                score -= 25  # Cannot be deployed
+            elif size >= 0.9 * EIP170_LIMIT:
+                score -= 10
+            elif size >= 0.75 * EIP170_LIMIT:
+                score -= 2
+
+        return max(0, score)
+
+    except:
+        return 80
+
+@instrumented('quality')
+def analyze_test_health(cache=None):
+    """Analyze pass rate and slow tests from saved forge test --json results, or None if there are none"""
+    cache = cache or get_cache()
+    try:
+        from forge_test_results import find_test_results, health_score, read_test_results
+
+        results = [result for path in find_test_results(cache) for result in read_test_results(path)]
+        return health_score(results)
+
+    except:
+        return None
+
 def main():
     """Main function"""
-    score = calculate_code_quality_score()
-    print(score)  # Output just the score for GitHub Actions
+    parser = argparse.ArgumentParser(description="Calculate the code quality score")
+    parser.add_argument('--watch', action='store_true', help="keep running and rescore on every change to src/")
+    parser.add_argument('--poll', type=float, metavar='SECONDS', help="with --watch, poll for changes instead of using inotify")
+    parser.add_argument('--include-lib', action='store_true', help="also score the dependencies in lib/ from their bundles")
+    parser.add_argument('--profile', metavar='DIR', help="write cProfile stats and a hot-function and memory report to DIR")
+    args = parser.parse_args()
+
+    with profiled(args.profile, 'calculate_quality_score'):
+        enable_from_env('calculate_quality_score')
+        if args.watch:
+            from quality_watch import watch
+            watch(get_cache(), args.poll)
+            return
+        cache = get_cache()
+        if args.include_lib:
+            cache.include_dependencies()
+        score = calculate_code_quality_score(cache)
+        print(score)  # Output just the score for GitHub Actions
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,21 +6,53 @@ This script analyzes Slither JSON output to generate a security score
 and extract key security metrics for the CI/CD pipeline.
 """
 
+import argparse
 import json
 import sys
 import os
 
-def calculate_security_score(slither_file):
+from ci_artifacts import get_cache
+from ci_metrics import enable_from_env, stage
+from ci_profile import profiled
+
+def calculate_security_score(slither_file, cache=None):
     """Calculate security score from Slither JSON report"""
 
+    cache = cache or get_cache()
+
     try:
-        with open(slither_file, 'r') as f:
-            data = json.load(f)
+        with stage('security', 'parse'):
+            data = cache.load_json(slither_file)
     except FileNotFoundError:
-        return 50  # Default score if file not found
+        return 50, {'score': 50, 'status': 'MISSING_REPORT'}  # Default score if file not found
     except json.JSONDecodeError:
-        return 45  # Lower score if invalid JSON
+        return 45, {'score': 45, 'status': 'INVALID_REPORT'}  # Lower score if invalid JSON
+
+    if cache.scope is not None:
+        data = limit_report(data, cache)
+
+    dependency_issues = None
+    if cache.dependency_bundles():
+        from dependency_bundles import without_dependencies
+        data, dependency_issues = without_dependencies(data, cache.dependency_bundles())
+
+    with stage('security', 'score'):
+        return score_report(data, dependency_issues)
+
+def limit_report(data, cache):
+    """Keep only the findings with an element in the files the cache is limited to"""
+    results = data.get('results', {})
+    detectors = [
+        issue for issue in results.get('detectors', [])
+        if any(
+            cache.in_scope(cache.root / element.get('source_mapping', {}).get('filename_relative', ''))
+            for element in issue.get('elements', [])
+        )
+    ]
+    return {**data, 'results': {**results, 'detectors': detectors}}
 
+def score_report(data, dependency_issues=None):
+    """Score a parsed Slither report, plus issue counts by severity from dependency bundles"""
     score = 100  # Start with perfect score
     issues = data.get('results', {}).get('detectors', [])
 
@@ -46,6 +78,11 @@ def calculate_security_score(slither_file):
             issue_counts[impact] += 1
             score -= severity_penalties[impact]
 
+    for impact, count in (dependency_issues or {}).items():
+        if impact in severity_penalties:
+            issue_counts[impact] += count
+            score -= severity_penalties[impact] * count
+
     # Bonus points for good practices
     checks = data.get('results', {}).get('printers', [])
 
@@ -71,7 +108,7 @@ def calculate_security_score(slither_file):
     # Create detailed report
     report = {
         'score': score,
-        'total_issues': len(issues),
+        'total_issues': len(issues) + sum((dependency_issues or {}).values()),
         'severity_breakdown': issue_counts,
         'checks_performed': len(checks),
         'status': 'EXCELLENT' if score >= 90 else
@@ -82,24 +119,38 @@ def calculate_security_score(slither_file):
 
     return score, report
 
+def write_report(slither_file, report):
+    """Save the detailed report next to the Slither JSON"""
+    report_file = slither_file.replace('.json', '_score_report.json')
+    try:
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+    except:
+        pass  # Fail silently if we can't write the report
+
 def main():
     """Main function"""
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser(description="Calculate the security score from a Slither JSON report")
+    parser.add_argument('slither_file', nargs='?', help="Slither JSON report")
+    parser.add_argument('--include-lib', action='store_true', help="also score the dependencies in lib/ from their bundles")
+    parser.add_argument('--profile', metavar='DIR', help="write cProfile stats and a hot-function and memory report to DIR")
+    args = parser.parse_args()
+    if args.slither_file is None:
         print("0")  # Default score
         sys.exit(0)
 
-    slither_file = sys.argv[1]
-    score, report = calculate_security_score(slither_file)
+    with profiled(args.profile, 'calculate_security_score'):
+        enable_from_env('calculate_security_score')
+        slither_file = args.slither_file
+        cache = get_cache()
+        if args.include_lib:
+            cache.include_dependencies()
+        score, report = calculate_security_score(slither_file, cache)
 
-    print(score)  # Output just the score for GitHub Actions
+        print(score)  # Output just the score for GitHub Actions
 
-    # Optional: Save detailed report
-    report_file = slither_file.replace('.json', '_score_report.json')
-    try:
-        with open(report_file, 'w') as f:
-            json.dump(report, f, indent=2)
-    except:
-        pass  # Fail silently if we can't write the report
+        # Optional: Save detailed report
+        write_report(slither_file, report)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+🗂️ Shared CI Artifact Cache
+
+Discovers and parses the artifacts produced by earlier pipeline stages
+(Slither JSON, LCOV coverage, gas reports, Gemini analysis, Solidity sources)
+once per process, so that several scoring tools running in the same
+interpreter never walk the tree or parse the same file twice.
+"""
+
+import json
+import os
+from pathlib import Path
+
+# Directories that never contain CI artifacts; forge build output is read
+# through forge_artifacts instead
+SKIP_DIRS = {'.git', '__pycache__', 'out', 'cache'}
+
+_caches = {}
+
+# Process-wide I/O counters, read by ci_metrics to attribute reads to stages
+IO_STATS = {'files_read': 0, 'bytes_read': 0, 'cache_hits': 0, 'cache_misses': 0}
+
+
+class ArtifactCache:
+    """Lazily built file index plus memoized file contents and parsed JSON"""
+
+    def __init__(self, root='.'):
+        self.root = Path(root)
+        self._files = None
+        self._by_name = None
+        self._text = {}
+        self._json = {}
+        self._forge_artifacts = {}
+        self._dependency_bundles = None
+        self.scope = None
+
+    def _index(self):
+        """Walk the tree once and index every file by its basename"""
+        if self._files is None:
+            files = []
+            by_name = {}
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+                for name in sorted(filenames):
+                    path = Path(dirpath) / name
+                    files.append(path)
+                    by_name.setdefault(name, []).append(path)
+            self._files = files
+            self._by_name = by_name
+        return self._files
+
+    def find(self, *names):
+        """Return every file in the tree whose basename is one of `names`"""
+        self._index()
+        found = []
+        for name in names:
+            found.extend(self._by_name.get(name, []))
+        return found
+
+    def limit_to(self, paths):
+        """Restrict `sources` to `paths`, given relative to the root; None lifts the limit"""
+        self.scope = None if paths is None else {Path(path).as_posix() for path in paths}
+
+    def in_scope(self, path):
+        """True if `path` is not excluded by `limit_to`"""
+        if self.scope is None:
+            return True
+        return Path(os.path.relpath(path, self.root)).as_posix() in self.scope
+
+    def sources(self, directory='src', suffix='.sol', scoped=True):
+        """Return the files below `directory` ending with `suffix`, within the scope unless `scoped` is False"""
+        prefix = (self.root / directory).parts
+        return [
+            path for path in self._index()
+            if path.parts[:len(prefix)] == prefix and path.name.endswith(suffix)
+            and (not scoped or self.in_scope(path))
+        ]
+
+    def read_text(self, path):
+        """Read a file once and serve later reads from memory"""
+        key = str(path)
+        if key in self._text:
+            IO_STATS['cache_hits'] += 1
+        else:
+            self._text[key] = Path(path).read_text()
+            IO_STATS['cache_misses'] += 1
+            IO_STATS['files_read'] += 1
+            IO_STATS['bytes_read'] += os.path.getsize(path)
+        return self._text[key]
+
+    def forge_artifacts(self, out_dir='out'):
+        """Return the shared index of the forge build artifacts in `out_dir`"""
+        if out_dir not in self._forge_artifacts:
+            from forge_artifacts import ArtifactIndex
+            self._forge_artifacts[out_dir] = ArtifactIndex(self.root / out_dir)
+        return self._forge_artifacts[out_dir]
+
+    def include_dependencies(self):
+        """Score the dependencies in lib/ alongside src, from their precomputed bundles"""
+        from dependency_bundles import load_bundles
+        self._dependency_bundles = load_bundles(self.root)
+
+    def dependency_bundles(self):
+        """`{path: bundle}` of the dependencies to score; empty unless `include_dependencies` was called"""
+        return self._dependency_bundles or {}
+
+    def load_json(self, path):
+        """Parse a JSON file once; errors propagate like `json.load`"""
+        key = str(path)
+        if key in self._json:
+            IO_STATS['cache_hits'] += 1
+        else:
+            self._json[key] = json.loads(self.read_text(path))
+        return self._json[key]
+
+
+def get_cache(root='.'):
+    """Return the process-wide cache for `root`"""
+    key = str(Path(root).resolve())
+    if key not in _caches:
+        _caches[key] = ArtifactCache(root)
+    return _caches[key]
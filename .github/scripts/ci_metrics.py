@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+⏱️ CI Stage Instrumentation
+
+Records wall time, files read, bytes read and artifact cache hit rate for
+each stage of the CI scoring scripts, and writes them in the Prometheus
+textfile-collector format and as JSON. Set CI_METRICS_DIR to enable it;
+otherwise every stage is a plain function call.
+"""
+
+import atexit
+import functools
+import json
+import os
+import time
+from pathlib import Path
+
+import ci_artifacts
+
+PREFIX = 'andechain_ci'
+
+_recorder = None
+
+
+class _Recorder:
+    """Per-stage totals for one entry point"""
+
+    def __init__(self, entrypoint, directory):
+        self.entrypoint = entrypoint
+        self.directory = Path(directory)
+        self.stages = {}
+
+    def add(self, component, name, seconds, io_before, io_after):
+        totals = self.stages.setdefault((component, name), {
+            'calls': 0, 'seconds': 0.0,
+            'files_read': 0, 'bytes_read': 0, 'cache_hits': 0, 'cache_misses': 0,
+        })
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        for key in ci_artifacts.IO_STATS:
+            totals[key] += io_after[key] - io_before[key]
+
+
+class _Stage:
+    """Context manager timing one stage"""
+
+    __slots__ = ('component', 'name', '_start', '_io')
+
+    def __init__(self, component, name):
+        self.component = component
+        self.name = name
+
+    def __enter__(self):
+        self._io = dict(ci_artifacts.IO_STATS)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        if _recorder is not None:
+            _recorder.add(self.component, self.name, seconds, self._io, ci_artifacts.IO_STATS)
+
+
+class _NullStage:
+    """Shared no-op stage used while instrumentation is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable(entrypoint, directory):
+    """Record stages and write them to `directory` when the process exits"""
+    global _recorder
+    if _recorder is None:
+        _recorder = _Recorder(entrypoint, directory)
+        atexit.register(write)
+    return _recorder
+
+
+def enable_from_env(entrypoint):
+    """Enable instrumentation if CI_METRICS_DIR is set"""
+    directory = os.getenv('CI_METRICS_DIR')
+    if directory:
+        enable(entrypoint, directory)
+
+
+def stage(component, name):
+    """Context manager measuring one stage; a no-op while disabled"""
+    if _recorder is None:
+        return _NULL_STAGE
+    return _Stage(component, name)
+
+
+def instrumented(component):
+    """Decorator measuring every call of a function as the stage of the same name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with _Stage(component, func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """Current per-stage totals as a JSON-serializable dict"""
+    if _recorder is None:
+        return None
+    stages = []
+    for (component, name), totals in _recorder.stages.items():
+        lookups = totals['cache_hits'] + totals['cache_misses']
+        stages.append(dict(
+            totals,
+            component=component,
+            stage=name,
+            cache_hit_ratio=totals['cache_hits'] / lookups if lookups else None,
+        ))
+    return {'entrypoint': _recorder.entrypoint, 'timestamp': time.time(), 'stages': stages}
+
+
+def to_prometheus(data):
+    """Render a snapshot in the Prometheus text exposition format"""
+    metrics = [
+        ('duration_seconds', 'seconds', 'gauge', 'Wall time spent in the stage'),
+        ('calls_total', 'calls', 'counter', 'Times the stage ran'),
+        ('files_read_total', 'files_read', 'counter', 'Files read from disk by the stage'),
+        ('bytes_read_total', 'bytes_read', 'counter', 'Bytes read from disk by the stage'),
+        ('cache_hits_total', 'cache_hits', 'counter', 'Artifact cache hits in the stage'),
+        ('cache_misses_total', 'cache_misses', 'counter', 'Artifact cache misses in the stage'),
+        ('cache_hit_ratio', 'cache_hit_ratio', 'gauge', 'Share of artifact cache lookups served from memory'),
+    ]
+    lines = []
+    for suffix, key, kind, help_text in metrics:
+        lines.append(f"# HELP {PREFIX}_stage_{suffix} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_stage_{suffix} {kind}")
+        for entry in data['stages']:
+            if entry[key] is None:
+                continue
+            labels = (f'entrypoint="{data["entrypoint"]}",'
+                      f'component="{entry["component"]}",stage="{entry["stage"]}"')
+            lines.append(f"{PREFIX}_stage_{suffix}{{{labels}}} {entry[key]}")
+
+    lines.append(f"# HELP {PREFIX}_last_run_timestamp_seconds When the stages were last recorded")
+    lines.append(f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge")
+    lines.append(f'{PREFIX}_last_run_timestamp_seconds{{entrypoint="{data["entrypoint"]}"}} {data["timestamp"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write():
+    """Write `<entrypoint>.prom` and `<entrypoint>.json` to the metrics directory"""
+    data = snapshot()
+    if data is None:
+        return
+    directory = _recorder.directory
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        # The textfile collector may read at any time, so files are replaced atomically
+        for suffix, content in (('.prom', to_prometheus(data)), ('.json', json.dumps(data, indent=2))):
+            path = directory / f"{data['entrypoint']}{suffix}"
+            tmp = path.with_name(path.name + '.tmp')
+            tmp.write_text(content)
+            os.replace(tmp, path)
+    except OSError:
+        pass  # Metrics must never fail the CI step
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+🔬 CI Script Profiling
+
+Shared `--profile DIR` support for the CI scripts. A profiled run writes
+`<name>.prof` (cProfile stats, readable with pstats or snakeviz) and
+`<name>-profile.txt` (hot functions plus tracemalloc peak and top allocation
+sites) to DIR. Nothing is printed to stdout, which GitHub Actions reads as
+the result.
+"""
+
+import cProfile
+import io
+import pstats
+import sys
+import tracemalloc
+from pathlib import Path
+
+TOP_N = 25
+
+
+class profiled:
+    """Context manager profiling its body into `directory`; does nothing if it is None"""
+
+    def __init__(self, directory, name, top=TOP_N):
+        self.directory = Path(directory) if directory else None
+        self.name = name
+        self.top = top
+        self._profile = None
+
+    def __enter__(self):
+        if self.directory is not None:
+            tracemalloc.start()
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profile is None:
+            return
+        self._profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stats_file = self.directory / f"{self.name}.prof"
+            self._profile.dump_stats(stats_file)
+            report_file = self.directory / f"{self.name}-profile.txt"
+            report_file.write_text(format_report(self._profile, snapshot, peak, self.top))
+            print(f"Profile written to {stats_file} and {report_file}", file=sys.stderr)
+        except OSError as e:
+            print(f"Could not write profile: {e}", file=sys.stderr)
+
+
+def format_report(profile, snapshot, peak, top=TOP_N):
+    """Hot functions by own and cumulative time, then memory peak and allocation sites"""
+    out = io.StringIO()
+    for sort_key, title in (('tottime', 'own time'), ('cumulative', 'cumulative time')):
+        out.write(f"Top {top} functions by {title}\n")
+        stats = pstats.Stats(profile, stream=out)
+        stats.strip_dirs().sort_stats(sort_key).print_stats(top)
+
+    out.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n\n")
+    out.write(f"Top {top} allocation sites still held at exit\n")
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        out.write(f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}\n")
+    return out.getvalue()
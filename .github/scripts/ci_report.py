@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+🧰 AndeChain CI Report
+
+Single entry point for the CI reporting tools. Runs one or more of the
+quality, security, untested-risk, gemini-summary and notify subcommands in
+one interpreter, so artifacts are discovered and parsed once and shared
+between them.
+
+Usage:
+    python3 ci_report.py quality
+    python3 ci_report.py quality security --slither slither-report.json
+    python3 ci_report.py all --slither slither-report.json --gemini analysis.json
+    python3 ci_report.py quality security --slither slither-report.json --affected-since origin/main
+
+With a single subcommand the output is identical to the standalone script.
+With several, each result is printed as `<subcommand>: <result>`.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+from ci_artifacts import get_cache
+from ci_metrics import enable_from_env
+from ci_profile import profiled
+
+COMMANDS = ['quality', 'security', 'untested-risk', 'gemini-summary', 'notify']
+
+def run_quality(args, cache, results):
+    """Calculate the code quality score"""
+    module = importlib.import_module('calculate_quality_score')
+    return module.calculate_code_quality_score(cache)
+
+def run_security(args, cache, results):
+    """Calculate the security score from the Slither report"""
+    module = importlib.import_module('calculate_security_score')
+    score, report = module.calculate_security_score(args.slither, cache)
+    module.write_report(args.slither, report)
+    return score
+
+def run_untested_risk(args, cache, results):
+    """Score the high and medium Slither findings on code no test executes"""
+    module = importlib.import_module('risk_coverage')
+    ranked, score, unmeasured = module.analyze_untested_risk(args.slither, args.lcov, cache)
+    return score
+
+def run_gemini_summary(args, cache, results):
+    """Format the Gemini analysis summary"""
+    module = importlib.import_module('extract_gemini_summary')
+    return module.extract_summary_from_analysis(args.gemini, cache)
+
+def run_notify(args, cache, results):
+    """Send the Discord notification, defaulting to a digest of the scores"""
+    module = importlib.import_module('notify_discord')
+    message = args.message
+    if message is None:
+        labels = {
+            'quality': 'Quality Score',
+            'security': 'Security Score',
+            'untested-risk': 'Untested Risk Score',
+        }
+        message = "\n".join(
+            f"**{labels[name]}**: {results[name]}/100"
+            for name in labels if name in results
+        ) or "CI pipeline finished"
+    return module.send_discord_notification(args.webhook, message, args.status)
+
+RUNNERS = {
+    'quality': run_quality,
+    'security': run_security,
+    'untested-risk': run_untested_risk,
+    'gemini-summary': run_gemini_summary,
+    'notify': run_notify,
+}
+
+def resolve_commands(args, parser):
+    """Expand `all` and check that every requested subcommand has its inputs"""
+    requested = []
+    for command in args.commands:
+        if command == 'all':
+            # Run everything whose inputs were provided
+            expanded = ['quality']
+            if args.slither:
+                expanded.append('security')
+            if args.slither and args.lcov:
+                expanded.append('untested-risk')
+            if args.gemini:
+                expanded.append('gemini-summary')
+            if args.webhook:
+                expanded.append('notify')
+        else:
+            expanded = [command]
+        for name in expanded:
+            if name not in requested:
+                requested.append(name)
+
+    if 'security' in requested and not args.slither:
+        parser.error("security requires --slither")
+    if 'untested-risk' in requested and not (args.slither and args.lcov):
+        parser.error("untested-risk requires --slither and --lcov")
+    if 'gemini-summary' in requested and not args.gemini:
+        parser.error("gemini-summary requires --gemini")
+    if 'notify' in requested and not args.webhook:
+        parser.error("notify requires --webhook or DISCORD_WEBHOOK_URL")
+
+    # notify summarizes the other results, so it always runs last
+    return sorted(requested, key=COMMANDS.index)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="AndeChain CI reporting tools")
+    parser.add_argument('commands', nargs='+', choices=COMMANDS + ['all'],
+                        help="subcommands to run, in one process")
+    parser.add_argument('--root', default='.',
+                        help="directory to discover artifacts in")
+    parser.add_argument('--slither', help="Slither JSON report")
+    parser.add_argument('--lcov', help="LCOV tracefile from forge coverage")
+    parser.add_argument('--gemini', help="Gemini analysis JSON")
+    parser.add_argument('--webhook', default=os.getenv('DISCORD_WEBHOOK_URL'),
+                        help="Discord webhook URL")
+    parser.add_argument('--message', help="notification message")
+    parser.add_argument('--status', default='info',
+                        choices=['success', 'failure', 'warning', 'info'],
+                        help="notification status")
+    parser.add_argument('--affected-since', metavar='REF',
+                        help="only score Solidity files affected by changes since REF (see import_graph.py)")
+    parser.add_argument('--include-lib', action='store_true',
+                        help="also score the dependencies in lib/ from their bundles (see dependency_bundles.py)")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="write cProfile stats and a hot-function and memory report to DIR")
+    args = parser.parse_args()
+
+    commands = resolve_commands(args, parser)
+    enable_from_env('ci_report')
+    cache = get_cache(args.root)
+    if args.affected_since:
+        from import_graph import affected_files
+        cache.limit_to(affected_files(args.root, base=args.affected_since))
+    if args.include_lib:
+        cache.include_dependencies()
+    results = {}
+    failed = False
+
+    with profiled(args.profile, 'ci_report'):
+        for name in commands:
+            result = RUNNERS[name](args, cache, results)
+            results[name] = result
+
+            if name == 'notify':
+                failed = failed or not result
+                continue
+
+            if len(commands) == 1:
+                print(result)
+            elif '\n' in str(result):
+                print(f"{name}:")
+                print(result)
+            else:
+                print(f"{name}: {result}")
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+🧪 Coverage Report
+
+Builds every coverage output the CI needs from the single LCOV tracefile of
+one `forge coverage --report lcov` run: the summary table, the total
+percentage, per-file metrics in `metrics.json` and a static HTML report with
+annotated sources.
+
+Usage:
+    python3 coverage_report.py coverage/lcov.info --output-dir coverage
+    python3 coverage_report.py coverage/lcov.info --percentage
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from lcov import read_lcov
+
+
+def percent(hit, found):
+    """Coverage percentage; 100 when there is nothing to cover"""
+    return 100.0 if found == 0 else hit / found * 100
+
+
+def file_metrics(record):
+    """Per-file line, function and branch totals"""
+    return {
+        'file': record.path,
+        'lines_found': record.lines_found,
+        'lines_hit': record.lines_hit,
+        'functions_found': record.functions_found,
+        'functions_hit': record.functions_hit,
+        'branches_found': record.branches_found,
+        'branches_hit': record.branches_hit,
+    }
+
+
+def totals(files):
+    """Sum of the per-file metrics"""
+    total = {'file': 'Total'}
+    for key in ('lines', 'functions', 'branches'):
+        for suffix in ('found', 'hit'):
+            total[f"{key}_{suffix}"] = sum(f[f"{key}_{suffix}"] for f in files)
+    return total
+
+
+def _cell(metrics, key):
+    hit, found = metrics[f"{key}_hit"], metrics[f"{key}_found"]
+    return f"{percent(hit, found):.2f}% ({hit}/{found})"
+
+
+def summary_table(files, total):
+    """Markdown table in the layout of `forge coverage --report summary`"""
+    rows = [('File', '% Lines', '% Branches', '% Funcs')]
+    for metrics in files + [total]:
+        rows.append((metrics['file'], _cell(metrics, 'lines'), _cell(metrics, 'branches'), _cell(metrics, 'functions')))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+
+    lines = ["| " + " | ".join(cell.ljust(widths[i]) for i, cell in enumerate(rows[0])) + " |"]
+    lines.append("|" + "|".join('-' * (w + 2) for w in widths) + "|")
+    for row in rows[1:]:
+        lines.append("| " + " | ".join(cell.ljust(widths[i]) for i, cell in enumerate(row)) + " |")
+    return "\n".join(lines)
+
+
+def write_metrics(path, files, total, source_root):
+    """metrics.json with the total percentage and per-file metrics
+
+    `files_analyzed` counts the Solidity files in src/, covered or not, as it always has.
+    """
+    metrics = {
+        'coverage_percentage': f"{percent(total['lines_hit'], total['lines_found']):.2f}%",
+        'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'files_analyzed': sum(1 for _ in (Path(source_root) / 'src').rglob('*.sol')),
+        'totals': total,
+        'files': files,
+    }
+    path.write_text(json.dumps(metrics, indent=2) + "\n")
+
+
+HTML_STYLE = """
+body { font-family: sans-serif; margin: 2em; }
+table { border-collapse: collapse; }
+th, td { padding: 0.2em 0.8em; border-bottom: 1px solid #ddd; text-align: left; }
+.bar { display: inline-block; height: 0.8em; background: #e55; width: 8em; }
+.bar span { display: block; height: 100%; background: #4a4; }
+pre { margin: 0; }
+.src td { border: none; padding: 0 0.5em; font-family: monospace; white-space: pre; }
+.hit { background: #dfd; }
+.miss { background: #fdd; }
+.count { color: #888; text-align: right; }
+"""
+
+
+def _page(title, body):
+    return (
+        f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+        f"<style>{HTML_STYLE}</style></head><body>\n<h1>{html.escape(title)}</h1>\n{body}\n</body></html>\n"
+    )
+
+
+def _page_name(path):
+    # The hash keeps paths such as src/a_b.sol and src/a/b.sol apart
+    name = path.replace('/', '_').replace('\\', '_')
+    return f"{name}-{hashlib.sha1(path.encode()).hexdigest()[:8]}.html"
+
+
+def write_html(directory, records, files, total, source_root):
+    """index.html with a row per file, linking to an annotated source page for each"""
+    directory.mkdir(parents=True, exist_ok=True)
+
+    rows = []
+    for record, metrics in zip(records, files):
+        pct = percent(metrics['lines_hit'], metrics['lines_found'])
+        rows.append(
+            f"<tr><td><a href=\"{_page_name(record.path)}\">{html.escape(record.path)}</a></td>"
+            f"<td><div class=\"bar\"><span style=\"width: {pct:.1f}%\"></span></div></td>"
+            f"<td>{_cell(metrics, 'lines')}</td><td>{_cell(metrics, 'branches')}</td>"
+            f"<td>{_cell(metrics, 'functions')}</td></tr>"
+        )
+    pct = percent(total['lines_hit'], total['lines_found'])
+    rows.append(
+        f"<tr><th>Total</th><td><div class=\"bar\"><span style=\"width: {pct:.1f}%\"></span></div></td>"
+        f"<th>{_cell(total, 'lines')}</th><th>{_cell(total, 'branches')}</th><th>{_cell(total, 'functions')}</th></tr>"
+    )
+    table = (
+        "<table><tr><th>File</th><th></th><th>Lines</th><th>Branches</th><th>Functions</th></tr>\n"
+        + "\n".join(rows) + "\n</table>"
+    )
+    (directory / 'index.html').write_text(_page("Coverage report", table))
+
+    for record in records:
+        source = Path(source_root) / record.path
+        try:
+            source_lines = source.read_text().splitlines()
+        except (OSError, UnicodeDecodeError):
+            source_lines = [''] * (max(record.lines, default=0))
+
+        body = ["<p><a href=\"index.html\">&larr; index</a></p><table class=\"src\">"]
+        for number, text in enumerate(source_lines, 1):
+            hits = record.lines.get(number)
+            css = '' if hits is None else (' class="hit"' if hits > 0 else ' class="miss"')
+            count = '' if hits is None else str(hits)
+            body.append(
+                f"<tr{css}><td class=\"count\">{number}</td><td class=\"count\">{count}</td>"
+                f"<td>{html.escape(text)}</td></tr>"
+            )
+        body.append("</table>")
+        (directory / _page_name(record.path)).write_text(_page(record.path, "\n".join(body)))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build coverage reports from one LCOV tracefile")
+    parser.add_argument('lcov', help="LCOV tracefile from forge coverage --report lcov")
+    parser.add_argument('--output-dir', metavar='DIR', help="write metrics.json and html/ to DIR")
+    parser.add_argument('--source-root', default='.', help="directory the tracefile paths are relative to")
+    parser.add_argument('--percentage', action='store_true', help="only print the total line coverage")
+    args = parser.parse_args()
+
+    try:
+        records = sorted(read_lcov(args.lcov), key=lambda r: r.path)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not read {args.lcov}: {e}")
+    files = [file_metrics(record) for record in records]
+    total = totals(files)
+
+    if args.percentage:
+        print(f"{percent(total['lines_hit'], total['lines_found']):.2f}%")
+        return
+
+    print(summary_table(files, total))
+    if args.output_dir:
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        write_metrics(output_dir / 'metrics.json', files, total, args.source_root)
+        write_html(output_dir / 'html', records, files, total, args.source_root)
+
+if __name__ == "__main__":
+    main()
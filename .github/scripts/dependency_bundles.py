@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+📦 Dependency Metric Bundles
+
+Precomputes the quality counts (lines, comments, functions, NatSpec, gas
+hotspots) and Slither issue counts of every dependency in `lib/`, keyed by
+its pinned revision: the `rev` of foundry.lock, else the submodule commit
+recorded by git, else a fingerprint of the content of its files for
+vendored copies. All bundles live in `cache/dependency-bundles.json` and
+are loaded with one read; a bundle is only rebuilt when the revision of its
+dependency moved, which for a vendored copy means its content changed.
+Scoring with `--include-lib` adds the bundles to the totals of `src/`
+instead of analyzing the dependencies again.
+
+Usage:
+    python3 dependency_bundles.py
+    python3 dependency_bundles.py --slither slither-report.json
+    python3 dependency_bundles.py --rebuild
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BUNDLE_FILE = 'cache/dependency-bundles.json'
+BUNDLE_VERSION = 2
+LIB_DIR = 'lib'
+# Parts of a dependency that are never compiled into our contracts
+SKIPPED_DIRS = {'test', 'tests', 'script', 'scripts', 'lib', 'node_modules', 'certora', '.git'}
+SEVERITIES = ('high', 'medium', 'low', 'informational')
+
+
+def locked_revisions(root):
+    """`{path: rev}` of the lib/ entries of foundry.lock"""
+    try:
+        lock = json.loads((Path(root) / 'foundry.lock').read_text())
+    except (OSError, ValueError):
+        return {}
+    revisions = {}
+    for path, entry in lock.items():
+        path = path.strip('/')
+        if not path.startswith(LIB_DIR + '/') or not isinstance(entry, dict):
+            continue
+        rev = entry.get('rev') or (entry.get('tag') or {}).get('rev') or (entry.get('branch') or {}).get('rev')
+        if rev:
+            revisions[path] = rev
+    return revisions
+
+
+def submodule_revisions(root):
+    """`{path: commit}` of the submodules under lib/ recorded in the git index"""
+    try:
+        output = subprocess.run(
+            ['git', 'ls-files', '--stage', '--', LIB_DIR], cwd=root, capture_output=True, text=True, check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    revisions = {}
+    for line in output.splitlines():
+        info, _, path = line.partition('\t')
+        mode, sha = info.split()[:2]
+        if mode == '160000':  # gitlink
+            revisions[path] = sha
+    return revisions
+
+
+def dependency_sources(directory):
+    """Solidity files of a dependency, leaving out its tests, scripts and nested dependencies"""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIPPED_DIRS)
+        files.extend(Path(dirpath) / name for name in sorted(filenames) if name.endswith('.sol'))
+    return files
+
+
+def index_blobs(root, directory):
+    """`{path: blob id}` of the files under `directory` whose content git has in its index, unmodified"""
+    def ls_files(*args):
+        return subprocess.run(
+            ['git', 'ls-files', '-z', *args, '--', str(directory)], cwd=root, capture_output=True, text=True, check=True,
+        ).stdout.split('\0')
+
+    try:
+        staged = ls_files('--stage')
+        modified = set(ls_files('--modified'))
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    blobs = {}
+    for entry in staged:
+        info, _, path = entry.partition('\t')
+        if path and path not in modified:
+            blobs[Path(root) / path] = info.split()[1]
+    return blobs
+
+
+def fingerprint(root, directory, files):
+    """Revision stand-in for vendored dependencies: hash of their relative paths and contents
+
+    Files git tracks unmodified take the blob id from its index; the rest
+    are read and hashed the way git would, so the key only moves with content.
+    """
+    blobs = index_blobs(root, directory)
+    digest = hashlib.sha256()
+    for path in files:
+        blob = blobs.get(path)
+        if blob is None:
+            data = path.read_bytes()
+            blob = hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+        digest.update(f"{path.relative_to(directory).as_posix()}:{blob}\n".encode())
+    return 'files:' + digest.hexdigest()[:16]
+
+
+def dependency_revisions(root):
+    """`{path: revision}` of every dependency directory in lib/"""
+    root = Path(root)
+    pinned = {**submodule_revisions(root), **locked_revisions(root)}
+    lib = root / LIB_DIR
+    paths = set(pinned)
+    if lib.is_dir():
+        paths.update(f"{LIB_DIR}/{entry.name}" for entry in os.scandir(lib) if entry.is_dir())
+    return {path: pinned.get(path) for path in sorted(paths)}
+
+
+def quality_counts(root, files):
+    """Additive quality counts of a dependency, as the src/ analyzers compute them"""
+    from calculate_quality_score import comment_counts, complexity_counts, natspec_counts
+    from gas_hotspots import detect_sources, hotspot_penalty
+
+    counts = dict.fromkeys((
+        'lines', 'commented_lines', 'functions', 'complex_functions',
+        'natspec_functions', 'documented_functions',
+    ), 0)
+    sources = []
+    for path in files:
+        try:
+            content = path.read_text()
+        except (OSError, UnicodeDecodeError):
+            continue
+        sources.append((path.relative_to(root).as_posix(), content))
+        lines, commented = comment_counts(content)
+        functions, complex_functions = complexity_counts(content)
+        natspec_functions, documented_functions = natspec_counts(content)
+        counts['lines'] += lines
+        counts['commented_lines'] += commented
+        counts['functions'] += functions
+        counts['complex_functions'] += complex_functions
+        counts['natspec_functions'] += natspec_functions
+        counts['documented_functions'] += documented_functions
+
+    findings, function_count = detect_sources(sources)
+    counts['hotspot_penalty'] = hotspot_penalty(findings)
+    counts['hotspot_functions'] = function_count
+    return counts
+
+
+def in_dependency(issue, path):
+    """True if any element of a Slither finding lies in the dependency at `path`"""
+    prefix = path.rstrip('/') + '/'
+    for element in issue.get('elements', []):
+        filename = element.get('source_mapping', {}).get('filename_relative', '')
+        if filename.startswith('./'):
+            filename = filename[2:]
+        if filename.startswith(prefix):
+            return True
+    return False
+
+
+def security_counts(report, path):
+    """Slither issue counts by severity of the findings in one dependency"""
+    counts = dict.fromkeys(SEVERITIES, 0)
+    for issue in report.get('results', {}).get('detectors', []):
+        impact = issue.get('impact', 'informational').lower()
+        if impact in counts and in_dependency(issue, path):
+            counts[impact] += 1
+    return counts
+
+
+def build_bundle(root, path, revision, pinned, files):
+    """Metrics bundle of the dependency at `path` from its source files"""
+    return {
+        'revision': revision,
+        'pinned': pinned,
+        'files': len(files),
+        'quality': quality_counts(root, files),
+        'security': None,
+    }
+
+
+def load_bundles(root='.', slither_report=None, rebuild=False, bundle_file=None):
+    """`{path: bundle}` of every checked-out dependency, rebuilt where its revision moved
+
+    With a parsed Slither report, bundles without security counts take them from it.
+    """
+    root = Path(root)
+    bundle_file = Path(bundle_file) if bundle_file else root / BUNDLE_FILE
+    try:
+        stored = json.loads(bundle_file.read_text())
+        if stored.get('version') != BUNDLE_VERSION:
+            stored = {}
+    except (OSError, ValueError):
+        stored = {}
+
+    previous = stored.get('dependencies', {})
+    bundles = {}
+    changed = False
+    for path, revision in dependency_revisions(root).items():
+        directory = root / path
+        pinned = revision is not None
+        files = None
+        if not pinned:
+            # Only the files of a vendored dependency tell whether it changed
+            files = dependency_sources(directory)
+            if not files:
+                continue
+            revision = fingerprint(root, directory, files)
+        elif not directory.is_dir() or not any(os.scandir(directory)):
+            continue  # submodule not checked out
+
+        bundle = previous.get(path)
+        if rebuild or bundle is None or bundle['revision'] != revision:
+            files = dependency_sources(directory) if files is None else files
+            if not files:
+                continue
+            bundle = build_bundle(root, path, revision, pinned, files)
+            changed = True
+        if slither_report is not None and bundle['security'] is None:
+            bundle['security'] = security_counts(slither_report, path)
+            changed = True
+        bundles[path] = bundle
+
+    if changed or bundles.keys() != previous.keys():
+        try:
+            bundle_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = bundle_file.with_name(bundle_file.name + '.tmp')
+            tmp.write_text(json.dumps({'version': BUNDLE_VERSION, 'dependencies': bundles}))
+            os.replace(tmp, bundle_file)
+        except OSError:
+            pass  # A read-only checkout only costs a rebuild next time
+    return bundles
+
+
+def without_dependencies(report, bundles):
+    """The Slither report minus findings in bundled dependencies, and the bundles' issue counts"""
+    counts = dict.fromkeys(SEVERITIES, 0)
+    covered = [path for path, bundle in bundles.items() if bundle['security'] is not None]
+    for path in covered:
+        for severity, count in bundles[path]['security'].items():
+            counts[severity] += count
+
+    results = report.get('results', {})
+    detectors = [
+        issue for issue in results.get('detectors', [])
+        if not any(in_dependency(issue, path) for path in covered)
+    ]
+    return {**report, 'results': {**results, 'detectors': detectors}}, counts
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build or show the metrics bundles of the dependencies in lib/")
+    parser.add_argument('--root', default='.', help="Foundry project root (default: cwd)")
+    parser.add_argument('--slither', metavar='PATH', help="Slither report including lib/ to take issue counts from")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild every bundle")
+    args = parser.parse_args()
+
+    report = None
+    if args.slither:
+        try:
+            with open(args.slither) as f:
+                report = json.load(f)
+        except (OSError, ValueError) as e:
+            sys.exit(f"Could not read {args.slither}: {e}")
+
+    bundles = load_bundles(args.root, report, args.rebuild)
+    if not bundles:
+        print("No checked-out dependencies in lib/")
+        return
+    for path, bundle in bundles.items():
+        quality = bundle['quality']
+        security = bundle['security']
+        if security is None:
+            issues = 'no Slither counts'
+        else:
+            issues = ', '.join(f"{n} {severity}" for severity, n in security.items() if n) or 'no issues'
+        print(f"{path} @ {bundle['revision'][:12]}: {bundle['files']} files, {quality['lines']} lines, "
+              f"{quality['hotspot_functions']} functions, {issues}")
+
+if __name__ == "__main__":
+    main()
@@ -6,22 +6,33 @@ This script extracts a formatted summary from Gemini AI analysis JSON output
 for use in GitHub PR comments and notifications.
 """
 
+import argparse
 import json
-import sys
 import os
 from datetime import datetime
 
-def extract_summary_from_analysis(analysis_file):
+from ci_artifacts import get_cache
+from ci_metrics import enable_from_env, stage
+from ci_profile import profiled
+
+def extract_summary_from_analysis(analysis_file, cache=None):
     """Extract formatted summary from Gemini analysis JSON"""
 
+    cache = cache or get_cache()
+
     try:
-        with open(analysis_file, 'r') as f:
-            data = json.load(f)
+        with stage('gemini', 'extract'):
+            data = cache.load_json(analysis_file)
     except FileNotFoundError:
         return "❌ Analysis file not found"
     except json.JSONDecodeError:
         return "❌ Invalid JSON format in analysis file"
 
+    with stage('gemini', 'render'):
+        return render_summary(data)
+
+def render_summary(data):
+    """Format a parsed Gemini analysis as markdown"""
     summary = data.get('summary', {})
     analyses = data.get('analyses', [])
 
@@ -123,13 +134,15 @@ def extract_summary_from_analysis(analysis_file):
 
 def main():
     """Main function"""
-    if len(sys.argv) != 2:
-        print("Usage: python3 extract_gemini_summary.py <analysis.json>")
-        sys.exit(1)
-
-    analysis_file = sys.argv[1]
-    summary = extract_summary_from_analysis(analysis_file)
-    print(summary)
+    parser = argparse.ArgumentParser(description="Format the summary of a Gemini analysis")
+    parser.add_argument('analysis_file', help="Gemini analysis JSON")
+    parser.add_argument('--profile', metavar='DIR', help="write cProfile stats and a hot-function and memory report to DIR")
+    args = parser.parse_args()
+
+    with profiled(args.profile, 'extract_gemini_summary'):
+        enable_from_env('extract_gemini_summary')
+        summary = extract_summary_from_analysis(args.analysis_file)
+        print(summary)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
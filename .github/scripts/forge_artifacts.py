@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+📦 Forge Build Artifact Reader
+
+Indexes Foundry's `out/**/*.json` artifacts (contract -> path, deployed
+bytecode size, ABI function count) without parsing them. The index is kept
+in `out/.artifact-index.json` and only artifacts whose size or mtime changed
+are rescanned. Full artifacts, or single top-level fields of them, are loaded
+lazily through mmap when asked for.
+"""
+
+import json
+import mmap
+import os
+import re
+import sys
+from pathlib import Path
+
+# EIP-170 limit on deployed bytecode size
+EIP170_LIMIT = 24576
+
+INDEX_FILE = '.artifact-index.json'
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+_FUNCTION_TYPE = re.compile(rb'"type"\s*:\s*"function"')
+
+
+class ArtifactIndex:
+    """Stat-validated index over the artifacts of a forge `out` directory"""
+
+    def __init__(self, out_dir='out', index_file=None):
+        self.out_dir = Path(out_dir)
+        self.index_file = Path(index_file) if index_file else self.out_dir / INDEX_FILE
+        self._entries = None
+
+    def entries(self):
+        """Return the index, scanning new or changed artifacts on first use"""
+        if self._entries is None:
+            self._entries = self._scan()
+        return self._entries
+
+    def get(self, name):
+        """Return the entry for `File.sol:Contract` or a unique bare contract name"""
+        entries = self.entries()
+        if name in entries:
+            return entries[name]
+        matches = [e for key, e in entries.items() if key.split(':', 1)[1] == name]
+        return matches[0] if len(matches) == 1 else None
+
+    def load(self, name):
+        """Parse the full artifact of a contract"""
+        with _mapped(self.out_dir / self.get(name)['path']) as data:
+            return json.loads(data[:])
+
+    def load_field(self, name, field):
+        """Parse a single top-level field of an artifact, skipping the rest (e.g. the AST)"""
+        with _mapped(self.out_dir / self.get(name)['path']) as data:
+            span = _value_span(data, field)
+            return json.loads(data[span[0]:span[1]]) if span else None
+
+    def near_size_limit(self, ratio=0.9):
+        """Contracts whose deployed bytecode is at least `ratio` of the EIP-170 limit"""
+        return sorted(
+            (e for e in self.entries().values() if e['deployed_size'] >= ratio * EIP170_LIMIT),
+            key=lambda e: e['deployed_size'],
+            reverse=True,
+        )
+
+    def _scan(self):
+        previous = self._read_index()
+        entries = {}
+        changed = False
+
+        if not self.out_dir.exists():
+            return entries
+
+        for source_dir in os.scandir(self.out_dir):
+            if not source_dir.is_dir() or not source_dir.name.endswith('.sol'):
+                continue  # skips build-info and the index itself
+            for artifact in os.scandir(source_dir.path):
+                if not artifact.name.endswith('.json'):
+                    continue
+                stat = artifact.stat()
+                key = f"{source_dir.name}:{artifact.name[:-len('.json')]}"
+                entry = previous.get(key)
+                if entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['file_size'] != stat.st_size:
+                    entry = _index_artifact(Path(artifact.path))
+                    entry.update({
+                        'path': f"{source_dir.name}/{artifact.name}",
+                        'source': source_dir.name,
+                        'contract': key.split(':', 1)[1],
+                        'mtime_ns': stat.st_mtime_ns,
+                        'file_size': stat.st_size,
+                    })
+                    changed = True
+                entries[key] = entry
+
+        if changed or entries.keys() != previous.keys():
+            self._write_index(entries)
+        return entries
+
+    def _read_index(self):
+        try:
+            data = json.loads(self.index_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return data.get('entries', {}) if data.get('version') == INDEX_VERSION else {}
+
+    def _write_index(self, entries):
+        try:
+            tmp = self.index_file.with_name(self.index_file.name + '.tmp')
+            tmp.write_text(json.dumps({'version': INDEX_VERSION, 'entries': entries}))
+            os.replace(tmp, self.index_file)
+        except OSError:
+            pass  # A read-only out dir only costs a rescan next time
+
+
+class _mapped:
+    """Read-only mmap of a file as a context manager"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self._file = open(self.path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._map = None
+        return self._map if self._map is not None else b''
+
+    def __exit__(self, *exc):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+def _index_artifact(path):
+    """Measure an artifact without parsing it"""
+    with _mapped(path) as data:
+        deployed = _value_start(data, 'deployedBytecode')
+        deployed_size = 0
+        if deployed is not None:
+            obj = _value_start(data, 'object', deployed)
+            if obj is not None and data[obj:obj + 1] == b'"':
+                # Hex never contains escapes, so the next quote ends the string
+                hex_start = obj + 3 if data[obj + 1:obj + 3] == b'0x' else obj + 1
+                deployed_size = max(0, data.find(b'"', obj + 1) - hex_start) // 2
+
+        abi = _value_span(data, 'abi')
+        functions = len(_FUNCTION_TYPE.findall(data, abi[0], abi[1])) if abi else 0
+
+    return {'deployed_size': deployed_size, 'abi_functions': functions}
+
+
+def _value_start(data, key, start=0, end=None):
+    """Offset of the JSON value of the first `"key":` in data[start:end]"""
+    end = len(data) if end is None else end
+    needle = b'"' + key.encode() + b'"'
+    pos = data.find(needle, start, end)
+    while pos != -1:
+        colon = pos + len(needle)
+        while colon < end and data[colon:colon + 1] in b' \t\r\n':
+            colon += 1
+        if data[colon:colon + 1] == b':':
+            break
+        pos = data.find(needle, pos + 1, end)
+    if pos == -1:
+        return None
+
+    value = colon + 1
+    while value < end and data[value:value + 1] in b' \t\r\n':
+        value += 1
+    return value
+
+
+def _value_span(data, key, start=0, end=None):
+    """Locate the JSON value of the first `"key":` in data[start:end] without decoding it"""
+    end = len(data) if end is None else end
+    value = _value_start(data, key, start, end)
+    if value is None:
+        return None
+
+    first = data[value:value + 1]
+    if first == b'"':
+        match = _TOKEN.match(data, value, end)
+        return (value, match.end()) if match else None
+    if first not in (b'{', b'['):
+        # Scalar: runs until the next delimiter
+        stop = value
+        while stop < end and data[stop:stop + 1] not in b',}] \t\r\n':
+            stop += 1
+        return value, stop
+
+    depth = 0
+    for match in _TOKEN.finditer(data, value, end):
+        token = match.group()
+        if token in (b'{', b'['):
+            depth += 1
+        elif token in (b'}', b']'):
+            depth -= 1
+            if depth == 0:
+                return value, match.end()
+    return None
+
+
+def main():
+    """Main function"""
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else 'out'
+    index = ArtifactIndex(out_dir)
+    entries = sorted(index.entries().values(), key=lambda e: e['deployed_size'], reverse=True)
+
+    print(f"{'contract':<50} {'size':>7} {'limit':>6} {'functions':>9}")
+    for entry in entries:
+        if entry['deployed_size'] == 0:
+            continue
+        name = f"{entry['source']}:{entry['contract']}"
+        share = entry['deployed_size'] / EIP170_LIMIT * 100
+        print(f"{name:<50} {entry['deployed_size']:>7} {share:>5.1f}% {entry['abi_functions']:>9}")
+
+if __name__ == "__main__":
+    main()
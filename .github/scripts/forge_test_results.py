@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+⏱️ Forge Test Results
+
+Streams the output of `forge test --json` one test at a time, decoding each
+result on its own so traces and logs of large suites are never held in
+memory together, and collects per-test duration, gas, fuzz or invariant
+runs and status. Reports the slowest tests, a time histogram per suite and
+the changes against a stored baseline, and scores test health for
+calculate_quality_score.py.
+
+Usage:
+    forge test --json > test-results/forge.json
+    python3 forge_test_results.py test-results/forge.json --top 20
+    python3 forge_test_results.py test-results/forge.json --save-baseline test-baseline.json
+    forge test --json | python3 forge_test_results.py - --baseline test-baseline.json
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+
+CHUNK_SIZE = 1 << 16
+RESULTS_DIR = 'test-results'
+BASELINE_VERSION = 1
+
+# Upper bounds in seconds of the histogram buckets
+BUCKETS = [(0.001, '<1ms'), (0.01, '<10ms'), (0.1, '<100ms'), (1.0, '<1s'), (10.0, '<10s'), (math.inf, '>=10s')]
+# Tests slower than this cost a point of test health each, up to MAX_SLOW_PENALTY
+SLOW_TEST_SECONDS = 5.0
+MAX_SLOW_PENALTY = 20
+# A test counts as slower than its baseline past both limits
+SLOWDOWN_RATIO = 1.5
+SLOWDOWN_SECONDS = 0.05
+GAS_CHANGE_RATIO = 0.01
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)\s*(ns|us|µs|ms|min|s|m|h)')
+_DURATION_UNITS = {'ns': 1e-9, 'us': 1e-6, 'µs': 1e-6, 'ms': 1e-3, 's': 1.0, 'm': 60.0, 'min': 60.0, 'h': 3600.0}
+
+
+class TestResult:
+    """One test of a `forge test --json` run"""
+
+    __slots__ = ('suite', 'name', 'status', 'kind', 'duration', 'gas', 'runs', 'reason')
+
+    def __init__(self, suite, name, data):
+        self.suite = suite  # `path:Contract`
+        self.name = name
+        self.status = data.get('status', 'Unknown')
+        self.reason = data.get('reason')
+        self.duration = parse_duration(data.get('duration'))
+        self.kind, self.gas, self.runs = _parse_kind(data.get('kind'))
+
+    @property
+    def id(self):
+        return f"{self.suite}::{self.name}"
+
+    @property
+    def contract(self):
+        return self.suite.rsplit(':', 1)[-1]
+
+
+def parse_duration(value):
+    """Seconds of a serialized duration (`{secs, nanos}`, humantime text or a number), or None"""
+    if isinstance(value, dict):
+        return value.get('secs', 0) + value.get('nanos', 0) / 1e9
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        parts = _DURATION_PART.findall(value)
+        if parts:
+            return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    return None
+
+
+def _parse_kind(kind):
+    """`(kind, gas, runs)` of the `kind` field: Unit gas, Fuzz mean gas and runs, Invariant runs"""
+    if not isinstance(kind, dict) or not kind:
+        return 'Unknown', None, None
+    name, info = next(iter(kind.items()))
+    info = info if isinstance(info, dict) else {}
+    if name == 'Unit':
+        return name, info.get('gas'), None
+    if name == 'Fuzz':
+        return name, info.get('mean_gas'), info.get('runs')
+    return name, None, info.get('runs')
+
+
+class JsonStream:
+    """Incremental reader of large JSON objects that decodes one member value at a time"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        """Append up to `size` characters, dropping what was consumed; False at end of input"""
+        if self.eof:
+            return False
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of input"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.chunk_size):
+                return ''
+
+    def skip_line(self):
+        """Drop the rest of the current line, e.g. non-JSON output before the results"""
+        while True:
+            end = self.buf.find('\n', self.pos)
+            if end != -1:
+                self.pos = end + 1
+                return
+            self.pos = len(self.buf)
+            if not self._fill(self.chunk_size):
+                return
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} but found {found or 'end of input'!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Incomplete value; grow geometrically so retries stay linear overall
+                if not self._fill(max(self.chunk_size, len(self.buf) - self.pos)):
+                    raise
+                continue
+            if end == len(self.buf) and self._fill(self.chunk_size):
+                continue  # a number may go on in the next chunk
+            self.pos = end
+            return value
+
+    def members(self):
+        """Yield the keys of the object at the current position; consume each value before resuming"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+
+def read_test_results(path, suite_durations=None):
+    """Yield a TestResult per test of `forge test --json` output at `path` ('-' for stdin)
+
+    Suite wall-clock times are copied into `suite_durations` if given.
+    """
+    f = sys.stdin if path == '-' else open(path)
+    try:
+        stream = JsonStream(f)
+        while True:
+            char = stream.peek()
+            if not char:
+                return
+            if char != '{':
+                stream.skip_line()
+                continue
+            for suite in stream.members():
+                if stream.peek() != '{':
+                    stream.value()
+                    continue
+                for field in stream.members():
+                    if field == 'test_results' and stream.peek() == '{':
+                        for name in stream.members():
+                            yield TestResult(suite, name, stream.value())
+                    elif field == 'duration' and suite_durations is not None:
+                        suite_durations[suite] = parse_duration(stream.value())
+                    else:
+                        stream.value()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def find_test_results(cache):
+    """`forge test --json` outputs saved under test-results/"""
+    return cache.sources(RESULTS_DIR, '.json', scoped=False)
+
+
+def slowest(results, top=20):
+    """The `top` tests with the longest duration"""
+    timed = [r for r in results if r.duration is not None]
+    return sorted(timed, key=lambda r: -r.duration)[:top]
+
+
+def suite_histograms(results):
+    """`{suite: [test count per BUCKETS entry]}`"""
+    histograms = {}
+    for r in results:
+        if r.duration is None:
+            continue
+        counts = histograms.setdefault(r.suite, [0] * len(BUCKETS))
+        for i, (limit, _) in enumerate(BUCKETS):
+            if r.duration < limit:
+                counts[i] += 1
+                break
+    return histograms
+
+
+def health_score(results):
+    """Score from 0 to 100: the pass rate, less a point per test slower than SLOW_TEST_SECONDS"""
+    ran = [r for r in results if r.status != 'Skipped']
+    if not ran:
+        return None
+    passed = sum(1 for r in ran if r.status == 'Success')
+    slow = sum(1 for r in ran if r.duration is not None and r.duration > SLOW_TEST_SECONDS)
+    return max(0, round(passed / len(ran) * 100 - min(MAX_SLOW_PENALTY, slow)))
+
+
+def baseline_of(results):
+    """Compact `{test id: {status, duration, gas}}` map to store as a baseline"""
+    return {
+        'version': BASELINE_VERSION,
+        'tests': {r.id: {'status': r.status, 'duration': r.duration, 'gas': r.gas} for r in results},
+    }
+
+
+def compare(results, baseline):
+    """Differences of a run from a baseline: slower tests, gas changes, new failures, added and removed tests"""
+    before = baseline.get('tests', {})
+    changes = {'slower': [], 'gas': [], 'new_failures': [], 'added': [], 'removed': []}
+    seen = set()
+    for r in results:
+        seen.add(r.id)
+        old = before.get(r.id)
+        if old is None:
+            changes['added'].append(r.id)
+            continue
+        if r.status == 'Failure' and old.get('status') != 'Failure':
+            changes['new_failures'].append(r.id)
+        old_duration = old.get('duration')
+        if (r.duration is not None and old_duration
+                and r.duration >= old_duration * SLOWDOWN_RATIO and r.duration - old_duration >= SLOWDOWN_SECONDS):
+            changes['slower'].append((r.id, old_duration, r.duration))
+        old_gas = old.get('gas')
+        if r.gas is not None and old_gas and abs(r.gas - old_gas) >= old_gas * GAS_CHANGE_RATIO:
+            changes['gas'].append((r.id, old_gas, r.gas))
+    changes['removed'] = sorted(set(before) - seen)
+    changes['slower'].sort(key=lambda c: -(c[2] - c[1]))
+    changes['gas'].sort(key=lambda c: -abs(c[2] - c[1]))
+    return changes
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    return f"{seconds:.2f}s"
+
+
+def print_slowest(results, top):
+    print(f"Slowest {top} tests:")
+    for r in slowest(results, top):
+        runs = f" {r.runs} runs" if r.runs is not None else ''
+        gas = f" gas {r.gas}" if r.gas is not None else ''
+        print(f"  {format_seconds(r.duration):>9}  {r.status:<7} {r.contract}.{r.name} [{r.kind}{runs}{gas}]")
+
+
+def print_histograms(results, suite_durations, width=30):
+    histograms = suite_histograms(results)
+    for suite in sorted(histograms, key=lambda s: -(suite_durations.get(s) or 0)):
+        counts = histograms[suite]
+        print(f"\n{suite} ({sum(counts)} tests, {format_seconds(suite_durations.get(suite))})")
+        largest = max(counts)
+        for (_, label), count in zip(BUCKETS, counts):
+            bar = '#' * (math.ceil(count / largest * width) if count else 0)
+            print(f"  {label:>7} {count:>5} {bar}")
+
+
+def print_comparison(changes):
+    print("\nCompared with the baseline:")
+    for test_id in changes['new_failures']:
+        print(f"  FAILING  {test_id}")
+    for test_id, old, new in changes['slower']:
+        print(f"  slower   {test_id}: {format_seconds(old)} -> {format_seconds(new)}")
+    for test_id, old, new in changes['gas']:
+        print(f"  gas      {test_id}: {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+    print(f"  {len(changes['added'])} tests added, {len(changes['removed'])} removed")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Report on forge test --json results")
+    parser.add_argument('results', nargs='+', help="forge test --json output files, '-' for stdin")
+    parser.add_argument('--top', type=int, default=20, help="number of slowest tests to list")
+    parser.add_argument('--baseline', metavar='PATH', help="compare with a baseline saved by --save-baseline")
+    parser.add_argument('--save-baseline', metavar='PATH', help="store this run as the baseline")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="exit 1 on new failures or slower tests compared with --baseline")
+    args = parser.parse_args()
+
+    results = []
+    suite_durations = {}
+    try:
+        for path in args.results:
+            results.extend(read_test_results(path, suite_durations))
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not read test results: {e}")
+
+    counts = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    print(f"{len(results)} tests in {len(suite_durations)} suites: "
+          + ", ".join(f"{n} {status.lower()}" for status, n in sorted(counts.items())))
+    print_slowest(results, args.top)
+    print_histograms(results, suite_durations)
+    print(f"\nTest health score: {health_score(results)}")
+
+    exit_code = 0
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                changes = compare(results, json.load(f))
+        except (OSError, ValueError) as e:
+            sys.exit(f"Could not read baseline {args.baseline}: {e}")
+        print_comparison(changes)
+        if args.fail_on_regression and (changes['new_failures'] or changes['slower']):
+            exit_code = 1
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(baseline_of(results), f)
+
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
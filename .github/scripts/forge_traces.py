@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+🔥 Forge Trace Gas Attribution
+
+Reads the call traces printed by `forge test -vvvv` line by line and
+rebuilds each call tree, attributing inclusive gas (the bracketed figure of
+a frame) and exclusive gas (inclusive minus that of its direct children)
+to every contract and function frame. Only the open call stack is kept in
+memory, so traces of any size stream through. Writes folded stacks of
+exclusive gas for flamegraph.pl, inferno or speedscope.
+
+Usage:
+    forge test --match-contract AndeSwapRouterTest -vvvv > traces.txt
+    python3 forge_traces.py traces.txt --folded gas.folded
+    forge test -vvvv | python3 forge_traces.py - --folded gas.folded
+    flamegraph.pl --countname gas gas.folded > gas.svg
+"""
+
+import argparse
+import re
+import sys
+
+TREE_CHARS = ' │├└─'
+
+_ANSI = re.compile(r'\x1b\[[0-9;]*m')
+_FRAME = re.compile(r'\[(\d+)\] (.+)$')
+_CALL_TYPE = re.compile(r'\s*\[(?:staticcall|delegatecall|callcode|call)\]$')
+
+
+def frame_label(call):
+    """`Contract::function` for a call, `new Contract` for a creation"""
+    call = _CALL_TYPE.sub('', call.strip())
+    if call.startswith('→ new '):
+        return 'new ' + call[len('→ new '):].split('@', 1)[0]
+    end = len(call)
+    for char in '({':
+        index = call.find(char)
+        if index != -1:
+            end = min(end, index)
+    return call[:end].replace(';', ':').strip()
+
+
+def parse_frame(line):
+    """`(column, gas, label)` of a trace line that opens a call frame, else None"""
+    body = line.lstrip(TREE_CHARS)
+    match = _FRAME.match(body)
+    if not match:
+        return None
+    return len(line) - len(body), int(match.group(1)), frame_label(match.group(2))
+
+
+class _Frame:
+    __slots__ = ('column', 'gas', 'children_gas')
+
+    def __init__(self, column, gas):
+        self.column = column
+        self.gas = gas
+        self.children_gas = 0
+
+
+def iter_frames(lines):
+    """Yield `(stack, inclusive, exclusive)` for every call frame once it is complete
+
+    `stack` is the tuple of frame labels from the root of the trace down to
+    the frame. Frames complete in post-order, children before their caller.
+    """
+    frames = []
+    labels = []
+
+    def close(column):
+        while frames and frames[-1].column >= column:
+            frame = frames.pop()
+            stack = tuple(labels)
+            labels.pop()
+            if frames:
+                frames[-1].children_gas += frame.gas
+            yield stack, frame.gas, max(0, frame.gas - frame.children_gas)
+
+    for line in lines:
+        if '\x1b' in line:
+            line = _ANSI.sub('', line)
+        parsed = parse_frame(line.rstrip('\n'))
+        if parsed is None:
+            # A trace ends at a blank or unindented line; returns, events and logs are skipped
+            if frames and (not line.strip() or not line[0].isspace()):
+                yield from close(0)
+            continue
+        column, gas, label = parsed
+        if frames and frames[-1].column >= column:
+            yield from close(column)
+        frames.append(_Frame(column, gas))
+        labels.append(label)
+    yield from close(0)
+
+
+def write_folded(frames, out):
+    """Write one `root;...;frame exclusive_gas` line per frame and pass the frames on"""
+    for stack, inclusive, exclusive in frames:
+        if exclusive:
+            out.write(f"{';'.join(stack)} {exclusive}\n")
+        yield stack, inclusive, exclusive
+
+
+def contract_of(label):
+    """Contract a frame runs in; a creation frame runs the constructor of the deployed contract"""
+    if label.startswith('new '):
+        return label[len('new '):]
+    return label.split('::', 1)[0]
+
+
+def summarize(frames):
+    """`{label: [calls, inclusive, exclusive]}` per function and per contract
+
+    Inclusive gas of a recursive frame is counted at its outermost call only.
+    """
+    functions = {}
+    contracts = {}
+    for stack, inclusive, exclusive in frames:
+        label = stack[-1]
+        contract = contract_of(label)
+        outermost = label not in stack[:-1]
+        outermost_contract = all(contract_of(other) != contract for other in stack[:-1])
+
+        totals = functions.setdefault(label, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += inclusive if outermost else 0
+        totals[2] += exclusive
+
+        totals = contracts.setdefault(contract, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += inclusive if outermost_contract else 0
+        totals[2] += exclusive
+    return functions, contracts
+
+
+def print_table(title, totals, top):
+    print(f"\n{title}")
+    print(f"  {'exclusive':>12} {'inclusive':>12} {'calls':>7}  name")
+    ranked = sorted(totals.items(), key=lambda item: -item[1][2])
+    for label, (calls, inclusive, exclusive) in ranked[:top]:
+        print(f"  {exclusive:>12,} {inclusive:>12,} {calls:>7}  {label}")
+    if len(ranked) > top:
+        print(f"  ... and {len(ranked) - top} more")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Attribute gas to call frames of forge test -vvvv traces")
+    parser.add_argument('traces', help="output of forge test -vvvv, '-' for stdin")
+    parser.add_argument('--folded', metavar='PATH', help="write folded stacks of exclusive gas to PATH")
+    parser.add_argument('--top', type=int, default=20, help="number of functions and contracts to list")
+    args = parser.parse_args()
+
+    try:
+        source = sys.stdin if args.traces == '-' else open(args.traces, encoding='utf-8', errors='replace')
+        folded = open(args.folded, 'w') if args.folded else None
+    except OSError as e:
+        sys.exit(f"Could not open traces: {e}")
+
+    try:
+        frames = iter_frames(source)
+        if folded is not None:
+            frames = write_folded(frames, folded)
+        functions, contracts = summarize(frames)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if folded is not None:
+            folded.close()
+
+    if not functions:
+        print("No call traces found; run forge test with -vvvv")
+        return
+    print_table("Gas by function", functions, args.top)
+    print_table("Gas by contract", contracts, args.top)
+
+if __name__ == "__main__":
+    main()
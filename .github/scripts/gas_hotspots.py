@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+⛽ Static Gas Hotspot Detector
+
+Tokenizes the Solidity sources once and runs a single pass over the token
+stream of every function, reporting located gas anti-patterns: state
+variables read inside loops, loops bounded by the length of a storage array,
+repeated `.length` reads and calldata arrays copied to memory. Every pass is
+linear in the number of tokens.
+"""
+
+import re
+import sys
+
+from ci_artifacts import get_cache
+
+SEVERITY_WEIGHTS = {'high': 10, 'medium': 3, 'low': 1}
+
+_TOKEN = re.compile(r'''
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<string>(?:hex|unicode)?"(?:[^"\\\n]|\\.)*"|(?:hex|unicode)?'(?:[^'\\\n]|\\.)*')
+  | (?P<word>[A-Za-z_$][\w$]*|\d[\w.]*)
+  | (?P<op>==|!=|<=|>=|&&|\|\||\+\+|--|[-+*/%&|^]=|<<=?|>>=?|=>|\S)
+''', re.VERBOSE | re.DOTALL)
+
+KEYWORDS = {
+    'if', 'else', 'for', 'while', 'do', 'return', 'returns', 'emit', 'revert', 'require',
+    'new', 'delete', 'try', 'catch', 'unchecked', 'assembly', 'break', 'continue',
+    'memory', 'storage', 'calldata', 'public', 'external', 'internal', 'private',
+    'view', 'pure', 'payable', 'constant', 'immutable', 'override', 'virtual',
+}
+CONTAINERS = {'contract', 'abstract', 'library', 'interface'}
+MEMBERS = {'function', 'modifier', 'constructor', 'fallback', 'receive'}
+SKIPPED_MEMBERS = {'struct', 'enum', 'event', 'error', 'using'}
+LOCATIONS = {'memory', 'storage', 'calldata'}
+
+
+def tokenize(source):
+    """Split Solidity source into `(text, line)` tokens, dropping whitespace and comments"""
+    tokens = []
+    line = 1
+    for match in _TOKEN.finditer(source):
+        text = match.group()
+        if match.lastgroup != 'skip':
+            tokens.append((text, line))
+        line += text.count('\n')
+    return tokens
+
+
+def match_brackets(tokens):
+    """Map the index of every opening bracket to its closing one"""
+    pairs = {}
+    stack = []
+    for i, (text, _) in enumerate(tokens):
+        if text in '({[':
+            stack.append(i)
+        elif text in ')}]' and stack:
+            pairs[stack.pop()] = i
+    return pairs
+
+
+def parse_contracts(tokens, pairs):
+    """Yield `(name, bases, state_vars, functions)` for every contract in the token stream"""
+    i = 0
+    while i < len(tokens):
+        if tokens[i][0] not in CONTAINERS or i + 1 >= len(tokens):
+            i += 1
+            continue
+        start = i + 2 if tokens[i][0] == 'abstract' else i + 1
+        if start >= len(tokens):
+            break
+        name = tokens[start][0]
+        body = start
+        while body < len(tokens) and tokens[body][0] != '{':
+            body += 1
+        if body not in pairs:
+            break
+        bases = [
+            text for j, (text, _) in enumerate(tokens[start + 1:body], start + 1)
+            if tokens[j - 1][0] in ('is', ',') and text not in ('is', ',')
+        ]
+        state_vars, functions = parse_members(tokens, pairs, body + 1, pairs[body])
+        yield name, bases, state_vars, functions
+        i = pairs[body] + 1
+
+
+def parse_members(tokens, pairs, start, end):
+    """Collect the state variables and function bodies of a contract body"""
+    state_vars = {}
+    functions = []
+    i = start
+    while i < end:
+        text = tokens[i][0]
+        # Find the end of this member: a top-level `;` or the closing brace of its body
+        j = i
+        body = None
+        while j < end and tokens[j][0] != ';':
+            if tokens[j][0] in '([' and j in pairs:
+                j = pairs[j]
+            elif tokens[j][0] == '{':
+                body = j
+                j = pairs.get(j, end)
+                break
+            j += 1
+
+        if text in MEMBERS:
+            functions.append(parse_function(tokens, pairs, i, body))
+        elif text not in SKIPPED_MEMBERS and body is None:
+            parse_state_var(tokens[i:j], state_vars)
+        i = j + 1
+    return state_vars, functions
+
+
+def parse_state_var(decl, state_vars):
+    """Record a state variable declaration: whether it is stored, an array or a mapping"""
+    names = [k for k, (text, _) in enumerate(decl) if text == '=']
+    stop = names[0] if names else len(decl)
+    if stop == 0 or not re.match(r'[A-Za-z_$]', decl[stop - 1][0]):
+        return
+    words = {text for text, _ in decl[:stop]}
+    if words & {'constant', 'immutable'}:
+        return  # not read from storage
+    type_end = next((k for k, (text, _) in enumerate(decl[:stop]) if text in KEYWORDS), stop - 1)
+    type_tokens = [text for text, _ in decl[:type_end]]
+    state_vars[decl[stop - 1][0]] = {
+        'dynamic_array': type_tokens[-2:] == ['[', ']'],
+        'array': type_tokens[-1:] == [']'],
+        'mapping': type_tokens[:1] == ['mapping'],
+    }
+
+
+def parse_function(tokens, pairs, start, body):
+    """Describe a function: name, external parameters stored in memory and its body range"""
+    kind = tokens[start][0]
+    name = tokens[start + 1][0] if kind in ('function', 'modifier') else kind
+    params = start + 1
+    while params < len(tokens) and tokens[params][0] != '(':
+        params += 1
+    params_end = pairs.get(params, params)
+    header_end = body if body is not None else params_end
+    attributes = {text for text, _ in tokens[params_end:header_end]}
+
+    memory_params = []
+    locals_ = set()
+    depth = 0
+    param_start = params + 1
+    for k in range(params + 1, params_end):
+        text = tokens[k][0]
+        if text in '([':
+            depth += 1
+        elif text in ')]':
+            depth -= 1
+        elif depth == 0 and text == ',':
+            param_start = k + 1
+        elif depth == 0 and (k + 1 == params_end or tokens[k + 1][0] == ','):
+            if re.match(r'[A-Za-z_$]', text) and text not in LOCATIONS:
+                locals_.add(text)
+                if tokens[k - 1][0] == 'memory':
+                    type_tokens = [t for t, _ in tokens[param_start:k - 1]]
+                    memory_params.append((text, tokens[k][1], type_tokens))
+
+    return {
+        'name': name,
+        'line': tokens[start][1],
+        'external': 'external' in attributes,
+        'memory_params': memory_params,
+        'params': locals_,
+        'body': (body, pairs[body]) if body is not None and body in pairs else None,
+    }
+
+
+def _finding(path, line, function, rule, severity, message):
+    return {
+        'file': str(path),
+        'line': line,
+        'function': function,
+        'rule': rule,
+        'severity': severity,
+        'message': message,
+    }
+
+
+def detect_function(path, tokens, pairs, function, state_vars):
+    """Run every detector over one function in a single pass over its tokens"""
+    findings = []
+    name = function['name']
+
+    # Calldata arrays copied to memory by an external function
+    if function['external']:
+        for param, line, type_tokens in function['memory_params']:
+            if type_tokens[-1:] == [']'] or type_tokens[-1:] in (['bytes'], ['string']):
+                findings.append(_finding(
+                    path, line, name, 'calldata-copy', 'low',
+                    f"`{param}` is copied from calldata to memory; declare it `calldata`"))
+
+    if function['body'] is None:
+        return findings
+    start, end = function['body']
+
+    shadowed = set(function['params'])
+    loops = []  # [body_end, condition_end, reported names, condition_start]
+    length_reads = {}
+    i = start + 1
+    while i < end:
+        text, line = tokens[i]
+        while loops and i > loops[-1][0]:
+            loops.pop()
+
+        if text in ('for', 'while') and i + 1 < end and tokens[i + 1][0] == '(':
+            header_end = pairs.get(i + 1, i + 1)
+            if text == 'for':
+                # The condition is the second clause of the header
+                semis = [k for k in range(i + 2, header_end) if tokens[k][0] == ';'][:2]
+                condition = (semis[0], semis[1]) if len(semis) == 2 else (header_end, header_end)
+            else:
+                condition = (i + 1, header_end)
+            after = header_end + 1
+            if after < end and tokens[after][0] == '{' and after in pairs:
+                body_end = pairs[after]
+            else:
+                body_end = after
+                while body_end < end and tokens[body_end][0] != ';':
+                    body_end = pairs.get(body_end, body_end) + 1 if tokens[body_end][0] in '([{' else body_end + 1
+            loops.append([body_end, condition[1], set(), condition[0]])
+
+        elif text == 'do' and i + 1 < end and tokens[i + 1][0] == '{' and i + 1 in pairs:
+            # The condition of `do { ... } while (...)` is parsed as a loop of its own
+            loops.append([pairs[i + 1], i, set(), i])
+
+        elif re.match(r'[A-Za-z_$]', text):
+            prev = tokens[i - 1][0]
+            nxt = tokens[i + 1][0] if i + 1 < end else ''
+
+            # Local declarations shadow state variables of the same name
+            if nxt in ('=', ';', ',', ')') and prev not in KEYWORDS - LOCATIONS and (
+                    prev in LOCATIONS or re.match(r'[A-Za-z_$]', prev) or prev == ']'):
+                shadowed.add(text)
+            elif prev != '.' and text in state_vars and text not in shadowed:
+                var = state_vars[text]
+                if nxt == '.' and i + 2 < end and tokens[i + 2][0] == 'length':
+                    in_condition = loops and loops[-1][3] < i < loops[-1][1]
+                    if var['dynamic_array']:
+                        if in_condition:
+                            findings.append(_finding(
+                                path, line, name, 'unbounded-storage-loop', 'high',
+                                f"loop bounded by `{text}.length`, a storage array that can grow without limit"))
+                            loops[-1][2].add(text)
+                        length_reads.setdefault(text, []).append(line)
+                elif (loops and i > loops[-1][3] and text not in loops[-1][2]
+                        and not var['mapping'] and not var['array']
+                        and nxt not in ('[', '=', '+=', '-=', '++', '--')):
+                    # Only scalars: indexed reads load a different slot on every iteration
+                    findings.append(_finding(
+                        path, line, name, 'storage-read-in-loop', 'medium',
+                        f"state variable `{text}` is read from storage on every iteration; cache it in a local"))
+                    loops[-1][2].add(text)
+
+        elif text == '.' and i + 1 < end and tokens[i + 1][0] == 'length':
+            owner = tokens[i - 1][0]
+            if owner not in state_vars or owner in shadowed:
+                in_condition = loops and loops[-1][3] < i < loops[-1][1]
+                if in_condition:
+                    findings.append(_finding(
+                        path, line, name, 'length-in-loop-condition', 'low',
+                        f"`{owner}.length` is re-read on every iteration; cache it before the loop"))
+                    loops[-1][2].add(owner)
+        i += 1
+
+    for owner, lines in length_reads.items():
+        if len(lines) > 1:
+            findings.append(_finding(
+                path, lines[1], name, 'repeated-length', 'low',
+                f"`{owner}.length` is read from storage {len(lines)} times; cache it in a local"))
+
+    return findings
+
+
+def detect_hotspots(cache=None, src_dir='src'):
+    """Findings for every Solidity file under `src_dir`, ordered by location, and the number of functions"""
+    cache = cache or get_cache()
+
+    def read_sources():
+        # Every file is parsed, so inherited state variables are known even when the cache
+        # is limited to a set of affected files
+        for path in cache.sources(src_dir, '.sol', scoped=False):
+            try:
+                yield path, cache.read_text(path)
+            except (OSError, UnicodeDecodeError):
+                continue
+
+    return detect_sources(read_sources(), cache.in_scope)
+
+
+def detect_sources(sources, in_scope=None):
+    """Findings and function count for `(path, text)` sources, skipping files `in_scope` rejects"""
+    # First pass: contracts of every file, so inherited state variables are known
+    contracts = {}
+    parsed = []
+    for path, text in sources:
+        tokens = tokenize(text)
+        pairs = match_brackets(tokens)
+        for name, bases, state_vars, functions in parse_contracts(tokens, pairs):
+            contracts[name] = (bases, state_vars)
+            parsed.append((path, tokens, pairs, name, functions))
+
+    all_state_vars = state_var_resolver(contracts)
+    findings = []
+    function_count = 0
+    for path, tokens, pairs, name, functions in parsed:
+        if in_scope is not None and not in_scope(path):
+            continue
+        contract_findings, count = detect_contract(path, tokens, pairs, functions, all_state_vars(name))
+        findings.extend(contract_findings)
+        function_count += count
+    return sorted(findings, key=lambda f: (f['file'], f['line'], f['rule'])), function_count
+
+
+def state_var_resolver(contracts):
+    """Return a memoized lookup of the own and inherited state variables of a contract by name"""
+    resolved = {}
+
+    def all_state_vars(name, seen=()):
+        if name not in resolved:
+            bases, own = contracts.get(name, ((), {}))
+            merged = {}
+            for base in bases:
+                if base not in seen:
+                    merged.update(all_state_vars(base, seen + (name,)))
+            merged.update(own)
+            resolved[name] = merged
+        return resolved[name]
+
+    return all_state_vars
+
+
+def detect_contract(path, tokens, pairs, functions, state_vars):
+    """Findings for the functions of one contract and the number of them with a body"""
+    findings = []
+    function_count = 0
+    for function in functions:
+        if function['body'] is not None:
+            function_count += 1
+        findings.extend(detect_function(path, tokens, pairs, function, state_vars))
+    return findings, function_count
+
+
+def hotspot_penalty(findings):
+    """Sum of the severity weights of `findings`"""
+    return sum(SEVERITY_WEIGHTS[f['severity']] for f in findings)
+
+
+def hotspot_score(findings, function_count, extra_penalty=0):
+    """Score from 0 to 100, penalizing weighted findings per function"""
+    if function_count == 0:
+        return None
+    penalty = hotspot_penalty(findings) + extra_penalty
+    return max(0, round(100 - 100 * penalty / (2 * function_count)))
+
+
+def main():
+    """Main function"""
+    root = sys.argv[1] if len(sys.argv) > 1 else '.'
+    findings, function_count = detect_hotspots(get_cache(root))
+    for finding in findings:
+        print(f"{finding['file']}:{finding['line']}: {finding['severity']}: "
+              f"[{finding['rule']}] {finding['function']}: {finding['message']}")
+    counts = {severity: 0 for severity in SEVERITY_WEIGHTS}
+    for finding in findings:
+        counts[finding['severity']] += 1
+    print(f"{len(findings)} findings in {function_count} functions: "
+          + ", ".join(f"{n} {severity}" for severity, n in counts.items()))
+    print(f"Gas hotspot score: {hotspot_score(findings, function_count)}")
+
+if __name__ == "__main__":
+    main()
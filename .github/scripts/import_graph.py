@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+🕸️ Solidity Import Graph
+
+Parses the `import` statements of a Foundry project, resolves them through
+remappings.txt and caches the resulting graph in `cache/import-graph.json`,
+reparsing only files whose size or mtime changed. Given the files changed
+by a `git diff`, it returns every file that depends on them, so the scoring
+and analysis stages can limit their work to that affected set.
+
+Usage:
+    python3 import_graph.py --base origin/main            # affected files, one per line
+    python3 import_graph.py --format csv src/dex/AndeSwapLibrary.sol
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path, PurePosixPath
+
+GRAPH_FILE = 'cache/import-graph.json'
+GRAPH_VERSION = 1
+ROOT_DIRS = ('src', 'test', 'script')
+# Changes to these can affect how every file compiles
+GLOBAL_FILES = ('foundry.toml', 'remappings.txt')
+
+_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_IMPORT = re.compile(r'\bimport\b[^;"\']*["\']([^"\']+)["\'][^;]*;')
+
+
+def parse_imports(source):
+    """Import paths of a Solidity source, in order"""
+    return _IMPORT.findall(_COMMENT.sub('', source))
+
+
+def load_remappings(root):
+    """`(context, prefix, target)` remappings of a project, longest prefix first"""
+    remappings = []
+    path = Path(root) / 'remappings.txt'
+    if path.exists():
+        for line in path.read_text().splitlines():
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            prefix, target = line.split('=', 1)
+            context, _, prefix = prefix.rpartition(':')
+            remappings.append((context, prefix, target))
+    return sorted(remappings, key=lambda r: (len(r[1]), len(r[0])), reverse=True)
+
+
+class ImportGraph:
+    """Import edges between the project's Solidity files, keyed by project-relative path"""
+
+    def __init__(self, root='.', graph_file=None):
+        self.root = Path(root)
+        self.graph_file = Path(graph_file) if graph_file else self.root / GRAPH_FILE
+        self.remappings = load_remappings(self.root)
+        self._files = None
+        self._dependents = None
+
+    def resolve(self, importer, path):
+        """Project-relative path of `path` imported from `importer`"""
+        if path.startswith(('./', '../')):
+            resolved = PurePosixPath(importer).parent / path
+        else:
+            resolved = None
+            for context, prefix, target in self.remappings:
+                if path.startswith(prefix) and (not context or importer.startswith(context)):
+                    resolved = PurePosixPath(target + path[len(prefix):])
+                    break
+            if resolved is None:
+                resolved = PurePosixPath(path)
+        return _normalize(resolved)
+
+    def files(self):
+        """`{path: [imported paths]}` for every file reachable from src, test and script"""
+        if self._files is None:
+            self._files = self._build()
+        return self._files
+
+    def dependents(self):
+        """Reverse edges: `{path: {files importing it}}`"""
+        if self._dependents is None:
+            dependents = {}
+            for path, imports in self.files().items():
+                for imported in imports:
+                    dependents.setdefault(imported, set()).add(path)
+            self._dependents = dependents
+        return self._dependents
+
+    def affected(self, changed):
+        """Changed files plus every file that imports them, directly or transitively"""
+        pending = [self.relative(path) for path in changed]
+        if any(path in GLOBAL_FILES for path in pending):
+            return sorted(self.files())
+
+        dependents = self.dependents()
+        affected = set()
+        while pending:
+            path = pending.pop()
+            if path is None or path in affected:
+                continue
+            affected.add(path)
+            pending.extend(dependents.get(path, ()))
+        return sorted(affected)
+
+    def relative(self, path):
+        """Project-relative form of a path given relative to the cwd or absolute, or None if outside"""
+        try:
+            return Path(os.path.abspath(path)).relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return None
+
+    def _build(self):
+        previous = self._read_cache()
+        files = {}
+        entries = {}
+        changed = False
+
+        pending = []
+        for directory in ROOT_DIRS:
+            for dirpath, dirnames, filenames in os.walk(self.root / directory):
+                dirnames.sort()
+                pending.extend(
+                    (Path(dirpath) / name).relative_to(self.root).as_posix()
+                    for name in sorted(filenames) if name.endswith('.sol')
+                )
+
+        # Follow imports into lib/ so changes to dependencies propagate too
+        while pending:
+            path = pending.pop()
+            if path in files:
+                continue
+            try:
+                stat = (self.root / path).stat()
+            except OSError:
+                files[path] = []  # unresolved import; kept so it can still be matched
+                continue
+            entry = previous.get(path)
+            if entry is None or entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                try:
+                    source = (self.root / path).read_text()
+                except (OSError, UnicodeDecodeError):
+                    source = ''
+                entry = {
+                    'mtime_ns': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'imports': [self.resolve(path, imported) for imported in parse_imports(source)],
+                }
+                changed = True
+            entries[path] = entry
+            files[path] = entry['imports']
+            pending.extend(entry['imports'])
+
+        if changed or entries.keys() != previous.keys():
+            self._write_cache(entries)
+        return files
+
+    def _cache_key(self):
+        return [list(r) for r in self.remappings]
+
+    def _read_cache(self):
+        try:
+            data = json.loads(self.graph_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if data.get('version') != GRAPH_VERSION or data.get('remappings') != self._cache_key():
+            return {}
+        return data.get('files', {})
+
+    def _write_cache(self, entries):
+        try:
+            self.graph_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.graph_file.with_name(self.graph_file.name + '.tmp')
+            tmp.write_text(json.dumps({'version': GRAPH_VERSION, 'remappings': self._cache_key(), 'files': entries}))
+            os.replace(tmp, self.graph_file)
+        except OSError:
+            pass  # A read-only checkout only costs a reparse next time
+
+
+def _normalize(path):
+    """Collapse `.` and `..` segments without touching the filesystem"""
+    parts = []
+    for part in path.parts:
+        if part == '..':
+            if parts:
+                parts.pop()
+        elif part != '.':
+            parts.append(part)
+    return '/'.join(parts)
+
+
+def git_changed_files(base, root='.'):
+    """Files changed between `base` and the working tree, as paths usable from the cwd"""
+    top = subprocess.run(
+        ['git', 'rev-parse', '--show-toplevel'], cwd=root, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    names = subprocess.run(
+        ['git', 'diff', '--name-only', '-z', base], cwd=root, capture_output=True, text=True, check=True,
+    ).stdout.split('\0')
+    return [os.path.join(top, name) for name in names if name]
+
+
+def affected_files(root='.', base=None, changed=None):
+    """Affected project-relative paths for a base ref or an explicit list of changed files"""
+    if changed is None:
+        changed = git_changed_files(base, root)
+    return ImportGraph(root).affected(changed)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="List the Solidity files affected by a change")
+    parser.add_argument('changed', nargs='*', help="changed files (default: git diff against --base)")
+    parser.add_argument('--root', default='.', help="Foundry project root (default: cwd)")
+    parser.add_argument('--base', default='origin/main', help="ref to diff against when no files are given")
+    parser.add_argument('--format', choices=['lines', 'csv', 'json'], default='lines',
+                        help="csv matches gemini-analysis.js --files")
+    parser.add_argument('--all', action='store_true', help="include lib/ files, not only src, test and script")
+    args = parser.parse_args()
+
+    try:
+        affected = affected_files(args.root, args.base, args.changed or None)
+    except subprocess.CalledProcessError as e:
+        sys.exit(f"git diff failed: {e.stderr.strip()}")
+    if not args.all:
+        affected = [path for path in affected if path.split('/', 1)[0] in ROOT_DIRS]
+
+    if args.format == 'csv':
+        print(','.join(affected))
+    elif args.format == 'json':
+        print(json.dumps(affected))
+    else:
+        print('\n'.join(affected))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+📑 LCOV Reader
+
+Streams the records of an LCOV tracefile (as written by
+`forge coverage --report lcov`) one source file at a time, with line hit
+counts and function and branch totals.
+"""
+
+from pathlib import Path
+
+
+class FileCoverage:
+    """Coverage of one `SF:` record"""
+
+    __slots__ = ('path', 'lines', 'functions', 'branches_found', 'branches_hit')
+
+    def __init__(self, path):
+        self.path = path
+        self.lines = {}       # line number -> hit count
+        self.functions = {}   # name -> [line, hit count]
+        self.branches_found = 0
+        self.branches_hit = 0
+
+    @property
+    def lines_found(self):
+        return len(self.lines)
+
+    @property
+    def lines_hit(self):
+        return sum(1 for hits in self.lines.values() if hits > 0)
+
+    @property
+    def functions_found(self):
+        return len(self.functions)
+
+    @property
+    def functions_hit(self):
+        return sum(1 for _, hits in self.functions.values() if hits > 0)
+
+
+def read_lcov(path):
+    """Yield a FileCoverage per record of the tracefile at `path`"""
+    record = None
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            tag, _, value = line.partition(':')
+            if tag == 'SF':
+                record = FileCoverage(value)
+            elif record is None:
+                continue
+            elif tag == 'DA':
+                number, hits = value.split(',')[:2]
+                number = int(number)
+                # A line can be reported more than once (e.g. by several functions)
+                record.lines[number] = record.lines.get(number, 0) + int(hits)
+            elif tag == 'FN':
+                number, name = value.split(',', 1)
+                record.functions.setdefault(name, [int(number), 0])
+            elif tag == 'FNDA':
+                hits, name = value.split(',', 1)
+                record.functions.setdefault(name, [0, 0])[1] += int(hits)
+            elif tag == 'BRDA':
+                taken = value.rsplit(',', 1)[1]
+                record.branches_found += 1
+                if taken not in ('-', '0'):
+                    record.branches_hit += 1
+            elif tag == 'end_of_record':
+                yield record
+                record = None
+
+
+def find_lcov(cache):
+    """Locate the LCOV tracefile of a forge coverage run, or None"""
+    found = cache.find('lcov.info', 'coverage.lcov')
+    return Path(found[0]) if found else None
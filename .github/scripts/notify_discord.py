@@ -8,7 +8,6 @@ This script sends notifications to Discord for CI/CD pipeline status.
 import json
 import sys
 import os
-import requests
 from datetime import datetime
 
 def send_discord_notification(webhook_url, message, status="info"):
@@ -48,6 +47,9 @@ def send_discord_notification(webhook_url, message, status="info"):
         "embeds": [embed]
     }
 
+    # Imported lazily: requests is by far the slowest import of the CI tools
+    import requests
+
     try:
         response = requests.post(webhook_url, json=payload, timeout=10)
         response.raise_for_status()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+👀 Quality Score Watch
+
+Long-running mode of calculate_quality_score.py. Watches `src/` with inotify
+(falling back to polling mtimes where inotify is unavailable) and keeps the
+per-file metrics and token stream of every contract in memory, so a save
+only rereads and rescores the changed file (plus files whose contracts
+inherit state variables from it) before the aggregate score is recomputed
+from the per-file totals. Coverage, storage packing and contract size come
+from build artifacts and keep the values of the initial run.
+
+Usage:
+    python3 calculate_quality_score.py --watch
+    python3 calculate_quality_score.py --watch --poll 0.5
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+import calculate_quality_score as quality
+from ci_artifacts import get_cache
+from gas_hotspots import (
+    detect_contract, hotspot_score, match_brackets, parse_contracts, state_var_resolver, tokenize,
+)
+
+POLL_INTERVAL = 1.0
+# Events this close together belong to one save (editors write, rename and chmod)
+SETTLE_SECONDS = 0.02
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CLOSE_WRITE = 0x00000008
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct('iIII')  # struct inotify_event without its name
+
+
+class InotifyWatcher:
+    """Recursive inotify watch of a directory tree, through libc"""
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch  # AttributeError where there is no inotify
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.dirs = {}
+        try:
+            self._watch_tree(self.directory)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        os.close(self.fd)
+
+    def _watch_tree(self, directory):
+        for dirpath, dirnames, _ in os.walk(directory):
+            wd = self._add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                raise OSError(error, os.strerror(error), dirpath)
+            self.dirs[wd] = dirpath
+
+    def _read(self):
+        """Paths of the Solidity files and directories named by the pending events"""
+        data = os.read(self.fd, 65536)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.directory)  # events were lost; rescan everything
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._watch_tree(path)
+                    except OSError:
+                        pass  # already gone again
+                changed.add(path)
+            elif name.endswith('.sol'):
+                changed.add(path)
+        return changed
+
+    def changes(self):
+        """Yield the set of changed paths after every save"""
+        while True:
+            select.select([self.fd], [], [])
+            changed = self._read()
+            while select.select([self.fd], [], [], SETTLE_SECONDS)[0]:
+                changed |= self._read()
+            if changed:
+                yield changed
+
+
+class PollingWatcher:
+    """Watch of a directory tree that compares file mtimes and sizes every `interval` seconds"""
+
+    def __init__(self, directory, interval=POLL_INTERVAL):
+        self.directory = str(directory)
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def close(self):
+        pass
+
+    def _scan(self):
+        snapshot = {}
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if name.endswith('.sol'):
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def changes(self):
+        """Yield the set of changed paths after every poll that found any"""
+        while True:
+            time.sleep(self.interval)
+            current = self._scan()
+            changed = {
+                path for path in current.keys() | self.snapshot.keys()
+                if current.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = current
+            if changed:
+                yield changed
+
+
+def open_watcher(directory, poll=None):
+    """InotifyWatcher on `directory`, or a PollingWatcher if `poll` is set or inotify is unavailable"""
+    if poll is None:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {POLL_INTERVAL}s", file=sys.stderr)
+            poll = POLL_INTERVAL
+    return PollingWatcher(directory, poll)
+
+
+class SourceFile:
+    """Token stream and quality metrics of one Solidity file"""
+
+    __slots__ = (
+        'tokens', 'pairs', 'contracts', 'lines', 'commented', 'functions', 'complex_functions',
+        'natspec_functions', 'documented_functions', 'findings', 'function_count', 'state_vars',
+    )
+
+    def __init__(self, content):
+        self.lines, self.commented = quality.comment_counts(content)
+        self.functions, self.complex_functions = quality.complexity_counts(content)
+        self.natspec_functions, self.documented_functions = quality.natspec_counts(content)
+        self.tokens = tokenize(content)
+        self.pairs = match_brackets(self.tokens)
+        self.contracts = list(parse_contracts(self.tokens, self.pairs))
+        self.findings = []
+        self.function_count = 0
+        self.state_vars = None  # resolved state variables per contract at the last detection
+
+
+class QualityWatch:
+    """Quality score of a source tree, kept current one changed file at a time"""
+
+    def __init__(self, cache=None, src_dir='src'):
+        self.cache = cache or get_cache()
+        self.src_dir = self.cache.root / src_dir
+
+        breakdown = {}
+        quality.calculate_code_quality_score(self.cache, breakdown)
+        self.metrics = breakdown
+        self.documentation_base = quality.documentation_base(self.cache)
+        self.storage_packing = quality.analyze_storage_packing(self.cache)
+
+        self.files = {}
+        for path in self.cache.sources(src_dir, '.sol', scoped=False):
+            try:
+                self.files[path] = SourceFile(self.cache.read_text(path))
+            except (OSError, UnicodeDecodeError):
+                continue
+        self._detect(set(self.files))
+        self.score = self._aggregate()
+
+    def update(self, paths):
+        """Rescore after `paths` changed; returns the files that were reread or dropped"""
+        targets = set()
+        for path in map(Path, paths):
+            targets.update(known for known in self.files if known == path or path in known.parents)
+            if path.is_dir():
+                targets.update(path.rglob('*.sol'))
+            elif path.suffix == '.sol':
+                targets.add(path)
+
+        for path in targets:
+            try:
+                self.files[path] = SourceFile(path.read_text())
+            except (OSError, UnicodeDecodeError):
+                self.files.pop(path, None)
+        self._detect(targets & self.files.keys())
+        self.score = self._aggregate()
+        return sorted(targets)
+
+    def _detect(self, changed):
+        """Rerun the gas hotspot detectors on changed files and on files whose inherited state changed"""
+        contracts = {}
+        for source in self.files.values():
+            for name, bases, state_vars, _ in source.contracts:
+                contracts[name] = (bases, state_vars)
+        all_state_vars = state_var_resolver(contracts)
+
+        for path, source in self.files.items():
+            state_vars = [all_state_vars(name) for name, _, _, _ in source.contracts]
+            if path not in changed and state_vars == source.state_vars:
+                continue
+            source.findings = []
+            source.function_count = 0
+            for (_, _, _, functions), resolved in zip(source.contracts, state_vars):
+                findings, count = detect_contract(path, source.tokens, source.pairs, functions, resolved)
+                source.findings.extend(findings)
+                source.function_count += count
+            source.state_vars = state_vars
+
+    def _aggregate(self):
+        files = self.files.values()
+
+        total_lines = sum(f.lines for f in files)
+        commented_lines = sum(f.commented for f in files)
+        self.metrics['documentation'] = max(
+            0, self.documentation_base - quality.comment_penalty(total_lines, commented_lines))
+
+        total_functions = sum(f.functions for f in files)
+        complex_functions = sum(f.complex_functions for f in files)
+        self.metrics['code_complexity'] = max(0, 100 - quality.complexity_penalty(total_functions, complex_functions))
+
+        natspec_functions = sum(f.natspec_functions for f in files)
+        documented_functions = sum(f.documented_functions for f in files)
+        natspec = documented_functions / natspec_functions * 100 if natspec_functions else 100
+        self.metrics['natspec_coverage'] = round(natspec)
+
+        hotspots = hotspot_score(
+            [finding for f in files for finding in f.findings], sum(f.function_count for f in files))
+        gas_scores = [score for score in (hotspots, self.storage_packing) if score is not None]
+        self.metrics['gas_efficiency'] = round(sum(gas_scores) / len(gas_scores)) if gas_scores else 85
+
+        return quality.weighted_score(self.metrics)
+
+
+def format_metrics(metrics):
+    return ', '.join(f"{metric} {metrics[metric]}" for metric in quality.WEIGHTS if metrics.get(metric) is not None)
+
+
+def watch(cache=None, poll=None):
+    """Print the quality score, then an updated one after every change to src/, until interrupted"""
+    state = QualityWatch(cache)
+    watcher = open_watcher(state.src_dir, poll)
+    mode = 'inotify' if isinstance(watcher, InotifyWatcher) else f"polling every {watcher.interval}s"
+    print(f"Watching {state.src_dir} ({mode}, {len(state.files)} files)", file=sys.stderr)
+    print(f"{state.score:.0f}  {format_metrics(state.metrics)}", flush=True)
+
+    try:
+        for changed in watcher.changes():
+            start = time.perf_counter()
+            updated = state.update(changed)
+            elapsed = (time.perf_counter() - start) * 1000
+            if updated:
+                names = ', '.join(str(path) for path in updated)
+                print(f"{state.score:.0f}  {format_metrics(state.metrics)}  [{names} in {elapsed:.1f} ms]", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
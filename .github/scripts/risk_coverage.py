@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+🎯 Untested Risk Report
+
+Joins high- and medium-impact Slither findings with LCOV line hit counts to
+find risky code that no test executes. Each file's instrumented lines are
+indexed once (sorted lines plus a prefix count of unhit ones), so every
+line range of a finding is checked with two binary searches. Findings are
+matched to LCOV records by their path relative to the project root;
+findings in files the coverage run did not instrument are listed
+separately and left out of the score.
+
+Usage:
+    python3 risk_coverage.py slither-report.json coverage/lcov.info
+"""
+
+import argparse
+import bisect
+import json
+import os
+import sys
+
+from ci_artifacts import get_cache
+from lcov import read_lcov
+
+IMPACT_WEIGHTS = {'High': 3.0, 'Medium': 2.0}
+CONFIDENCE_WEIGHTS = {'High': 1.0, 'Medium': 0.7, 'Low': 0.4}
+# Score points lost by a fully uncovered finding of each impact
+RISK_PENALTIES = {'High': 15, 'Medium': 7}
+
+
+class LineIndex:
+    """Instrumented lines of one file and a prefix count of the unhit ones"""
+
+    __slots__ = ('lines', 'unhit_before')
+
+    def __init__(self, hits_by_line):
+        self.lines = sorted(hits_by_line)
+        self.unhit_before = [0]
+        for line in self.lines:
+            self.unhit_before.append(self.unhit_before[-1] + (hits_by_line[line] == 0))
+
+    def count(self, start, end):
+        """`(instrumented, unhit)` line counts in the inclusive range start..end"""
+        lo = bisect.bisect_left(self.lines, start)
+        hi = bisect.bisect_right(self.lines, end)
+        return hi - lo, self.unhit_before[hi] - self.unhit_before[lo]
+
+
+class CoverageIndex:
+    """LineIndex per source file, keyed by its path relative to the project root"""
+
+    def __init__(self, records, root='.'):
+        self.root = os.path.abspath(root)
+        self.files = {self.key(record.path): LineIndex(record.lines) for record in records}
+
+    def key(self, path):
+        """Normalized project-relative path; paths outside the project stay absolute"""
+        path = path.replace(os.sep, '/')
+        if os.path.isabs(path):
+            relative = os.path.relpath(path, self.root)
+            if not relative.startswith('..'):
+                path = relative
+        return os.path.normpath(path).replace(os.sep, '/')
+
+    def get(self, path):
+        return self.files.get(self.key(path))
+
+
+def build_index(lcov_path, root='.'):
+    """CoverageIndex of every record of an LCOV tracefile"""
+    return CoverageIndex(read_lcov(lcov_path), root)
+
+
+def _intervals(lines):
+    """Collapse line numbers into sorted inclusive `(start, end)` runs"""
+    runs = []
+    for line in sorted(set(lines)):
+        if runs and line == runs[-1][1] + 1:
+            runs[-1][1] = line
+        else:
+            runs.append([line, line])
+    return runs
+
+
+def finding_ranges(issue):
+    """`{file: [(start, end)]}` covered by a finding, preferring its statement-level elements"""
+    elements = issue.get('elements', [])
+    nodes = [e for e in elements if e.get('type') == 'node']
+    by_file = {}
+    for element in nodes or elements:
+        mapping = element.get('source_mapping', {})
+        path = mapping.get('filename_relative') or mapping.get('filename_absolute')
+        if path and mapping.get('lines'):
+            by_file.setdefault(path, []).extend(mapping['lines'])
+    return {path: _intervals(lines) for path, lines in by_file.items()}
+
+
+def untested_findings(slither_data, index):
+    """High and medium findings ranked by how much of their code is unexecuted
+
+    Findings in files the coverage run did not instrument (dependencies,
+    scripts) cannot be measured; they are returned separately, unranked.
+    """
+    ranked = []
+    unmeasured = []
+    for issue in slither_data.get('results', {}).get('detectors', []):
+        impact = issue.get('impact')
+        if impact not in IMPACT_WEIGHTS:
+            continue
+        for path, ranges in finding_ranges(issue).items():
+            line_index = index.get(path)
+            if line_index is None:
+                unmeasured.append({
+                    'check': issue.get('check', 'unknown'),
+                    'impact': impact,
+                    'confidence': issue.get('confidence'),
+                    'file': path,
+                    'lines': [tuple(r) for r in ranges],
+                })
+                continue
+            instrumented = unhit = 0
+            for start, end in ranges:
+                found, missed = line_index.count(start, end)
+                instrumented += found
+                unhit += missed
+            if instrumented == 0:
+                continue  # only declarations, nothing a test can execute
+
+            uncovered = unhit / instrumented
+            if uncovered == 0:
+                continue
+            weight = IMPACT_WEIGHTS[impact] * CONFIDENCE_WEIGHTS.get(issue.get('confidence'), 0.5)
+            ranked.append({
+                'check': issue.get('check', 'unknown'),
+                'impact': impact,
+                'confidence': issue.get('confidence'),
+                'file': path,
+                'lines': [tuple(r) for r in ranges],
+                'instrumented_lines': instrumented,
+                'uncovered_lines': unhit,
+                'uncovered_ratio': uncovered,
+                'risk': weight * uncovered,
+                'description': issue.get('description', '').strip().split('\n')[0],
+            })
+    ranked.sort(key=lambda f: (-f['risk'], f['file'], f['lines']))
+    unmeasured.sort(key=lambda f: (f['file'], f['lines']))
+    return ranked, unmeasured
+
+
+def risk_score(ranked):
+    """Score from 0 to 100 that drops with every uncovered high or medium finding"""
+    penalty = sum(RISK_PENALTIES[f['impact']] * f['uncovered_ratio'] for f in ranked)
+    return max(0, round(100 - penalty))
+
+
+def analyze_untested_risk(slither_file, lcov_file, cache=None):
+    """Ranked untested findings, the combined risk score and the findings outside the coverage run"""
+    cache = cache or get_cache()
+    ranked, unmeasured = untested_findings(cache.load_json(slither_file), build_index(lcov_file, cache.root))
+    return ranked, risk_score(ranked), unmeasured
+
+
+def format_ranges(ranges):
+    return ','.join(f"{start}" if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Rank Slither findings on code that no test executes")
+    parser.add_argument('slither', help="Slither JSON report")
+    parser.add_argument('lcov', help="LCOV tracefile from forge coverage")
+    parser.add_argument('--top', type=int, default=20, help="number of findings to list")
+    parser.add_argument('--json', metavar='PATH', help="also write the full ranking as JSON")
+    args = parser.parse_args()
+
+    try:
+        ranked, score, unmeasured = analyze_untested_risk(args.slither, args.lcov)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not read inputs: {e}")
+
+    for f in ranked[:args.top]:
+        print(f"{f['risk']:5.2f}  {f['impact']:<6} {f['check']:<28} {f['file']}:{format_ranges(f['lines'])} "
+              f"({f['uncovered_lines']}/{f['instrumented_lines']} lines unexecuted)")
+    if len(ranked) > args.top:
+        print(f"... and {len(ranked) - args.top} more")
+    if unmeasured:
+        files = len({f['file'] for f in unmeasured})
+        print(f"{len(unmeasured)} findings in {files} files outside the coverage run were not scored")
+    print(f"Untested risk score: {score}")
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'score': score, 'findings': ranked, 'unmeasured': unmeasured}, out, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,26 @@
 #!/bin/bash
 
 # 📊 Run Coverage Analysis Script
-# This script runs Foundry coverage and generates reports
+# This script runs Foundry coverage once and derives every report from its lcov output
 
 set -e
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
 echo "🧪 Running Foundry coverage analysis..."
 
 # Create coverage directory
 mkdir -p coverage
 
-# Run coverage with Foundry
-forge coverage --report lcov --report html --output-dir coverage
+# Run coverage with Foundry (the only run: summary, metrics and html all come from this lcov)
+forge coverage --report lcov --report-file coverage/lcov.info
 
-# Generate coverage summary
+# Generate coverage summary, coverage/metrics.json and the html report in coverage/html
 echo "📈 Coverage Summary:"
-forge coverage --report summary
+python3 "$SCRIPT_DIR/coverage_report.py" coverage/lcov.info --output-dir coverage
 
-# Extract coverage percentage
-COVERAGE_PERCENTAGE=$(forge coverage --report summary | grep -o '[0-9]*\.[0-9]*%' | head -1)
+# Extract coverage percentage from the metrics written above
+COVERAGE_PERCENTAGE=$(python3 -c "import json; print(json.load(open('coverage/metrics.json'))['coverage_percentage'])")
 
 echo "✅ Coverage analysis completed: $COVERAGE_PERCENTAGE"
-
-# Save coverage metrics to file for CI
-cat > coverage/metrics.json << EOF
-{
-  "coverage_percentage": "$COVERAGE_PERCENTAGE",
-  "timestamp": "$(date -u +%Y-%m-%dT%H:%M:%SZ)",
-  "files_analyzed": $(find src -name "*.sol" | wc -l)
-}
-EOF
-
-echo "📊 Coverage metrics saved to coverage/metrics.json"
\ No newline at end of file
+echo "📊 Coverage metrics saved to coverage/metrics.json"
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+📈 Score History
+
+Append-only SQLite store of every CI run's quality, security and Gemini
+scores and their per-metric breakdown, tagged with commit, branch and
+timestamp. Indexed by (name, branch, time) so trend and regression queries
+stay in the milliseconds across thousands of runs.
+
+Usage:
+    python3 score_history.py record --slither slither-report.json --gemini analysis.json
+    python3 score_history.py record --value quality=78 --value security=75
+    python3 score_history.py trend security --branch main --last 50
+    python3 score_history.py regressions --branch main --threshold 5
+"""
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from ci_artifacts import get_cache
+
+DEFAULT_DB = os.getenv('SCORE_HISTORY_DB', 'score-history.sqlite')
+
+# Scores where a higher value is worse, such as issue counts
+LOWER_IS_BETTER = ('security.issues.',)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    recorded_at REAL NOT NULL,
+    commit_sha TEXT,
+    branch TEXT
+);
+CREATE TABLE IF NOT EXISTS scores (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    branch TEXT,
+    recorded_at REAL NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_name ON scores (name, recorded_at);
+CREATE INDEX IF NOT EXISTS scores_by_name_branch ON scores (name, branch, recorded_at);
+CREATE INDEX IF NOT EXISTS runs_by_commit ON runs (commit_sha);
+
+-- History is append-only
+CREATE TRIGGER IF NOT EXISTS runs_append_only_update BEFORE UPDATE ON runs
+BEGIN SELECT RAISE(ABORT, 'score history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS runs_append_only_delete BEFORE DELETE ON runs
+BEGIN SELECT RAISE(ABORT, 'score history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS scores_append_only_update BEFORE UPDATE ON scores
+BEGIN SELECT RAISE(ABORT, 'score history is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS scores_append_only_delete BEFORE DELETE ON scores
+BEGIN SELECT RAISE(ABORT, 'score history is append-only'); END;
+"""
+
+
+def worsening(name, before, after):
+    """How much worse a score got from `before` to `after`; negative if it improved"""
+    return after - before if name.startswith(LOWER_IS_BETTER) else before - after
+
+
+class ScoreHistory:
+    """Append-only store of scores per run"""
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def record(self, scores, commit_sha=None, branch=None, recorded_at=None):
+        """Store one run; `scores` maps names like `quality` or `quality.documentation` to values"""
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (recorded_at, commit_sha, branch) VALUES (?, ?, ?)",
+                (recorded_at, commit_sha, branch),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO scores (run_id, name, branch, recorded_at, value) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, name, branch, recorded_at, float(value)) for name, value in scores.items()],
+            )
+        return run_id
+
+    def names(self):
+        """Every score name ever recorded"""
+        return [row[0] for row in self.db.execute("SELECT DISTINCT name FROM scores ORDER BY name")]
+
+    def trend(self, name, branch=None, since=None, last=None):
+        """`(recorded_at, commit_sha, branch, value)` rows of one score, oldest first"""
+        query = """
+            SELECT s.recorded_at, r.commit_sha, s.branch, s.value
+            FROM scores s JOIN runs r ON r.id = s.run_id
+            WHERE s.name = ?
+        """
+        params = [name]
+        if branch is not None:
+            query += " AND s.branch = ?"
+            params.append(branch)
+        if since is not None:
+            query += " AND s.recorded_at >= ?"
+            params.append(since)
+        query += " ORDER BY s.recorded_at DESC, s.run_id DESC"
+        if last is not None:
+            query += " LIMIT ?"
+            params.append(last)
+        return list(reversed(self.db.execute(query, params).fetchall()))
+
+    def regressions(self, branch=None, window=10, threshold=5.0, names=None):
+        """Scores whose latest value is at least `threshold` worse than the mean of the `window` runs before it"""
+        found = []
+        for name in (self.names() if names is None else sorted(names)):
+            rows = self.trend(name, branch, last=window + 1)
+            if len(rows) < 2:
+                continue
+            *history, (_, commit_sha, _, value) = rows
+            baseline = sum(row[3] for row in history) / len(history)
+            drop = worsening(name, baseline, value)
+            if drop >= threshold:
+                found.append({
+                    'name': name,
+                    'value': value,
+                    'baseline': baseline,
+                    'runs': len(history),
+                    'drop': drop,
+                    'commit': commit_sha,
+                })
+        return sorted(found, key=lambda r: -r['drop'])
+
+
+def git_value(env_name, *git_args):
+    """Value from the GitHub Actions environment, else from git"""
+    value = os.getenv(env_name)
+    if value:
+        return value
+    try:
+        return subprocess.run(['git', *git_args], capture_output=True, text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect_scores(args):
+    """Compute the scores of the current tree and flatten their breakdowns"""
+    cache = get_cache(args.root)
+    scores = {}
+
+    if not args.no_quality:
+        from calculate_quality_score import calculate_code_quality_score
+        breakdown = {}
+        scores['quality'] = calculate_code_quality_score(cache, breakdown)
+        scores.update({f"quality.{metric}": value for metric, value in breakdown.items() if value is not None})
+
+    if args.slither:
+        from calculate_security_score import calculate_security_score
+        score, report = calculate_security_score(args.slither, cache)
+        scores['security'] = score
+        for severity, count in report.get('severity_breakdown', {}).items():
+            scores[f"security.issues.{severity}"] = count
+
+    if args.gemini:
+        try:
+            averages = cache.load_json(args.gemini).get('summary', {}).get('averageScores', {})
+        except (OSError, ValueError):
+            averages = {}
+        for metric, value in averages.items():
+            if isinstance(value, (int, float)):
+                scores[f"gemini.{metric}"] = value
+
+    scores.update(args.values or [])
+    return scores
+
+
+def score_value(item):
+    """`(name, value)` of a NAME=VALUE argument"""
+    name, _, value = item.partition('=')
+    try:
+        return name, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=NUMBER, got {item!r}")
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def cmd_record(history, args):
+    """Record the scores of this run"""
+    scores = collect_scores(args)
+    if not scores:
+        print("Nothing to record", file=sys.stderr)
+        return 1
+    commit_sha = args.commit or git_value('GITHUB_SHA', 'rev-parse', 'HEAD')
+    branch = args.branch or git_value('GITHUB_REF_NAME', 'rev-parse', '--abbrev-ref', 'HEAD')
+    run_id = history.record(scores, commit_sha, branch)
+    print(f"Recorded run {run_id} ({len(scores)} scores) for {commit_sha or 'unknown commit'} on {branch or 'unknown branch'}")
+    return 0
+
+
+def cmd_trend(history, args):
+    """Print the history of one score, marking drops"""
+    since = time.time() - args.days * 86400 if args.days else None
+    rows = history.trend(args.name, args.branch, since, args.last)
+    if not rows:
+        print(f"No history for {args.name}")
+        return 1
+
+    print(f"{'recorded (UTC)':<17} {'commit':<10} {'branch':<20} {'value':>7} {'change':>7}")
+    previous = None
+    for recorded_at, commit_sha, branch, value in rows:
+        change = '' if previous is None else f"{value - previous:+.1f}"
+        marker = '  <-- drop' if previous is not None and worsening(args.name, previous, value) >= args.threshold else ''
+        print(f"{format_time(recorded_at):<17} {(commit_sha or '')[:10]:<10} {(branch or '')[:20]:<20} "
+              f"{value:>7.1f} {change:>7}{marker}")
+        previous = value
+
+    values = [row[3] for row in rows]
+    print(f"\n{len(values)} runs: min {min(values):.1f}, max {max(values):.1f}, "
+          f"mean {sum(values) / len(values):.1f}, net {values[-1] - values[0]:+.1f}")
+    return 0
+
+
+def cmd_regressions(history, args):
+    """Report scores whose latest run regressed; exits 1 if any did"""
+    names = None if args.all else {name for name in history.names() if '.' not in name}
+    found = history.regressions(args.branch, args.window, args.threshold, names)
+    if not found:
+        print("No regressions")
+        return 0
+    for r in found:
+        print(f"{r['name']}: {r['value']:.1f} vs {r['baseline']:.1f} over the previous {r['runs']} runs "
+              f"(worse by {r['drop']:.1f}) at {(r['commit'] or 'unknown commit')[:10]}")
+    return 1
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Historical CI score store")
+    parser.add_argument('--db', default=DEFAULT_DB, help="SQLite database (default: $SCORE_HISTORY_DB or score-history.sqlite)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="compute and store the scores of this run")
+    record.add_argument('--root', default='.', help="directory to discover artifacts in")
+    record.add_argument('--slither', help="Slither JSON report")
+    record.add_argument('--gemini', help="Gemini analysis JSON")
+    record.add_argument('--no-quality', action='store_true', help="do not compute the quality score")
+    record.add_argument('--value', dest='values', action='append', type=score_value, metavar='NAME=VALUE',
+                        help="record an already computed score, may be repeated")
+    record.add_argument('--commit', help="commit (default: $GITHUB_SHA or HEAD)")
+    record.add_argument('--branch', help="branch (default: $GITHUB_REF_NAME or the current branch)")
+    record.set_defaults(func=cmd_record)
+
+    trend = commands.add_parser('trend', help="print the history of one score")
+    trend.add_argument('name', help="score name, e.g. security or quality.documentation")
+    trend.add_argument('--branch', help="only runs on this branch")
+    trend.add_argument('--days', type=float, help="only the last DAYS days")
+    trend.add_argument('--last', type=int, help="only the last N runs")
+    trend.add_argument('--threshold', type=float, default=5.0, help="mark drops of at least this much")
+    trend.set_defaults(func=cmd_trend)
+
+    regressions = commands.add_parser('regressions', help="compare the latest run with the runs before it")
+    regressions.add_argument('--branch', help="only runs on this branch")
+    regressions.add_argument('--window', type=int, default=10, help="number of earlier runs to average")
+    regressions.add_argument('--threshold', type=float, default=5.0, help="smallest drop to report")
+    regressions.add_argument('--all', action='store_true', help="also check per-metric breakdowns")
+    regressions.set_defaults(func=cmd_regressions)
+
+    args = parser.parse_args()
+    history = ScoreHistory(args.db)
+    try:
+        sys.exit(args.func(history, args))
+    finally:
+        history.close()
+
+if __name__ == "__main__":
+    main()
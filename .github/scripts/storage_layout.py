@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+🧱 Storage Layout Packing Analyzer
+
+Reads the `storageLayout` that forge writes into each build artifact (enabled
+with `extra_output = ["storageLayout"]`) and measures how well state variables
+and structs are packed into 32-byte slots: slot utilization, the number of
+slots a reordering of the same fields would need, and the worst offenders.
+"""
+
+import sys
+
+from ci_artifacts import get_cache
+
+SLOT_SIZE = 32
+
+
+def _slot_bound(type_info):
+    """True for types that always start a new slot and fill whole slots"""
+    return (
+        type_info.get('encoding', 'inplace') != 'inplace'
+        or 'members' in type_info
+        or 'base' in type_info
+        or int(type_info['numberOfBytes']) >= SLOT_SIZE
+    )
+
+
+def _slots_needed(items):
+    """Slots that a list of `(size, slot_bound)` fields occupy in declaration order"""
+    slots = 0
+    used = SLOT_SIZE  # bytes used in the current slot; full means start a new one
+    for size, bound in items:
+        if bound:
+            slots += -(-size // SLOT_SIZE)
+            used = SLOT_SIZE
+        elif used + size > SLOT_SIZE:
+            slots += 1
+            used = size
+        else:
+            used += size
+    return slots
+
+
+def _optimal_slots(items):
+    """Slots needed after reordering: whole-slot fields plus first-fit decreasing for the rest"""
+    slots = sum(-(-size // SLOT_SIZE) for size, bound in items if bound)
+    free = []
+    for size in sorted((size for size, bound in items if not bound), reverse=True):
+        for i, space in enumerate(free):
+            if space >= size:
+                free[i] -= size
+                break
+        else:
+            free.append(SLOT_SIZE - size)
+    return slots + len(free)
+
+
+def analyze_members(members, types):
+    """Packing statistics of a contract's storage or a struct's members"""
+    end = 0
+    used_bytes = 0
+    runs = []
+    for member in members:
+        type_info = types[member['type']]
+        size = int(type_info['numberOfBytes'])
+        bound = _slot_bound(type_info)
+        end = max(end, int(member['slot']) * SLOT_SIZE + member['offset'] + size)
+        used_bytes += size
+
+        # Inherited variables can only be reordered within their own contract
+        owner = member.get('contract')
+        if not runs or runs[-1][0] != owner:
+            runs.append((owner, []))
+        runs[-1][1].append((size, bound))
+
+    slots = -(-end // SLOT_SIZE)
+    optimal = sum(_optimal_slots(items) for _, items in runs)
+    return {
+        'slots': slots,
+        'optimal_slots': min(slots, optimal),
+        'savable_slots': max(0, slots - optimal),
+        'utilization': used_bytes / (slots * SLOT_SIZE) if slots else 1.0,
+    }
+
+
+def analyze_layout(name, layout):
+    """Analyze one contract's storage layout and the structs it declares"""
+    types = layout.get('types') or {}
+    results = [dict(analyze_members(layout.get('storage') or [], types), kind='contract', name=name)]
+    for type_info in types.values():
+        if 'members' in type_info:
+            results.append(dict(
+                analyze_members(type_info['members'], types),
+                kind='struct',
+                name=type_info['label'].replace('struct ', '', 1),
+            ))
+    return results
+
+
+def analyze_storage_packing(cache=None, src_dir='src'):
+    """Packing results for every built contract with sources under `src_dir`"""
+    cache = cache or get_cache()
+    sources = {path.name for path in cache.sources(src_dir, '.sol')}
+    index = cache.forge_artifacts()
+
+    results = {}
+    for key, entry in sorted(index.entries().items()):
+        if entry['source'] not in sources:
+            continue
+        layout = index.load_field(key, 'storageLayout')
+        if not layout:
+            continue
+        for result in analyze_layout(key, layout):
+            # Structs are shared by every contract that inherits or imports them
+            results.setdefault((result['kind'], result['name']), result)
+    return list(results.values())
+
+
+def worst_packed(results, limit=10):
+    """Results that waste the most slots, then the least utilized"""
+    wasteful = [r for r in results if r['savable_slots'] > 0]
+    return sorted(wasteful, key=lambda r: (-r['savable_slots'], r['utilization']))[:limit]
+
+
+def packing_score(results):
+    """Score from 0 to 100 for the storage packing of a set of results"""
+    if not results:
+        return None
+    score = 100 - 5 * sum(r['savable_slots'] for r in results)
+    return max(0, score)
+
+
+def main():
+    """Main function"""
+    root = sys.argv[1] if len(sys.argv) > 1 else '.'
+    results = analyze_storage_packing(get_cache(root))
+    if not results:
+        print("No storage layouts found; build with extra_output = [\"storageLayout\"]")
+        return
+
+    print(f"{'kind':<9} {'name':<60} {'slots':>5} {'optimal':>7} {'used':>6}")
+    for result in worst_packed(results, limit=len(results)):
+        print(
+            f"{result['kind']:<9} {result['name']:<60} {result['slots']:>5} "
+            f"{result['optimal_slots']:>7} {result['utilization'] * 100:>5.1f}%"
+        )
+    print(f"Storage packing score: {packing_score(results)}")
+
+if __name__ == "__main__":
+    main()
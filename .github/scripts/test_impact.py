@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+🎯 Test Impact Index
+
+Maps source lines to the Foundry tests that execute them, so a change only
+runs the tests it can affect. `build` lists the suite with
+`forge test --list --json` and runs one `forge coverage` per test (in
+parallel, each worker with its own build directories so compilation is
+shared between its runs), then stores a compact index in
+`cache/test-impact.json`: per source file, sorted line ranges that each
+point to a deduplicated set of tests. `select` reads a `git diff` and prints
+the tests whose lines changed. Changes the index cannot place (test
+helpers, interfaces, new files, declarations between functions) fall back
+to the tests of the affected files in the import graph. Changes to
+foundry.toml, remappings.txt, foundry.lock, lib/, other configuration or
+test fixtures select the whole suite, as does any Solidity file neither
+the index nor the import graph knows.
+
+Usage:
+    python3 test_impact.py build --jobs 8
+    python3 test_impact.py select                       # diff against the indexed commit
+    python3 test_impact.py select --base origin/main --format json
+    git diff -U0 origin/main | python3 test_impact.py select --diff -
+"""
+
+import argparse
+import bisect
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from import_graph import GLOBAL_FILES, ImportGraph
+from lcov import read_lcov
+
+INDEX_FILE = 'cache/test-impact.json'
+INDEX_VERSION = 1
+WORKER_DIR = 'cache/test-impact'
+# Changes here can affect how every test compiles or runs
+SUITE_WIDE = GLOBAL_FILES + ('foundry.lock',)
+SUITE_WIDE_DIRS = ('lib/',)
+# Other inputs of a test run: configuration, .env (forge loads it) and fixtures under test/
+CONFIG_SUFFIXES = ('.toml', '.lock')
+FIXTURE_DIRS = ('test/',)
+
+_HUNK = re.compile(r'@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@')
+
+
+def test_id(path, contract, name):
+    """`path:Contract::test`, the id forge_test_results.py uses"""
+    return f"{path}:{contract}::{name}"
+
+
+def split_test_id(test):
+    suite, _, name = test.rpartition('::')
+    path, _, contract = suite.rpartition(':')
+    return path, contract, name
+
+
+def list_tests(root, forge='forge'):
+    """Every test of the suite as a test id, from `forge test --list --json`"""
+    output = subprocess.run(
+        [forge, 'test', '--list', '--json'], cwd=root, capture_output=True, text=True, check=True,
+    ).stdout
+    # Skip any compiler progress printed before the JSON
+    listing, _ = json.JSONDecoder().raw_decode(output, output.index('{'))
+    return sorted(
+        test_id(path, contract, name)
+        for path, contracts in listing.items()
+        for contract, names in contracts.items()
+        for name in names
+    )
+
+
+def _normalize(path):
+    return path[2:] if path.startswith('./') else path
+
+
+def run_test_coverage(root, test, workdir, report, forge='forge', extra_args=()):
+    """`{path: {line: hits}}` of one test, from its own `forge coverage` run; None if the run failed"""
+    path, contract, name = split_test_id(test)
+    command = [
+        forge, 'coverage', '--report', 'lcov', '--report-file', str(report),
+        '--match-path', path, '--match-contract', f"^{contract}$", '--match-test', f"^{re.escape(name)}$",
+        '--out', str(workdir / 'out'), '--cache-path', str(workdir / 'cache'), *extra_args,
+    ]
+    result = subprocess.run(command, cwd=root, capture_output=True, text=True)
+    if result.returncode != 0 or not report.exists():
+        return None
+    try:
+        return {_normalize(record.path): record.lines for record in read_lcov(report)}
+    finally:
+        report.unlink()
+
+
+def build_index(root='.', jobs=None, forge='forge', extra_args=(), tests=None, progress=None):
+    """Run every test's coverage in parallel and return the compact line-range index"""
+    root = Path(root)
+    tests = list_tests(root, forge) if tests is None else sorted(tests)
+    jobs = jobs or os.cpu_count() or 1
+
+    # One directory per worker, reused across its runs so each worker compiles once
+    workers = queue.Queue()
+    for k in range(jobs):
+        workers.put(root / WORKER_DIR / f"worker-{k}")
+    reports = Path(tempfile.mkdtemp(prefix='test-impact-'))
+
+    def run(item):
+        i, test = item
+        workdir = workers.get()
+        try:
+            return i, run_test_coverage(root, test, workdir, reports / f"{i}.info", forge, extra_args)
+        finally:
+            workers.put(workdir)
+
+    line_tests = {}   # path -> line -> set of test indices; unhit instrumented lines map to an empty set
+    unmapped = []
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for done, (i, coverage) in enumerate(pool.map(run, enumerate(tests)), 1):
+                if coverage is None:
+                    unmapped.append(i)
+                else:
+                    for path, lines in coverage.items():
+                        file_lines = line_tests.setdefault(path, {})
+                        for line, hits in lines.items():
+                            tests_on_line = file_lines.setdefault(line, set())
+                            if hits > 0:
+                                tests_on_line.add(i)
+                if progress is not None:
+                    progress(done, len(tests), tests[i], coverage is not None)
+    finally:
+        shutil.rmtree(reports, ignore_errors=True)
+
+    return compact_index(tests, line_tests, unmapped, git_head(root))
+
+
+def compact_index(tests, line_tests, unmapped, commit=None):
+    """Collapse per-line test sets into `[start, end, set id]` ranges over instrumented lines"""
+    sets = []
+    set_ids = {}
+    files = {}
+    for path in sorted(line_tests):
+        ranges = []
+        for line in sorted(line_tests[path]):
+            key = tuple(sorted(line_tests[path][line]))
+            if key not in set_ids:
+                set_ids[key] = len(sets)
+                sets.append(list(key))
+            # Instrumented lines with the same tests merge across the lines between them
+            if ranges and ranges[-1][2] == set_ids[key]:
+                ranges[-1][1] = line
+            else:
+                ranges.append([line, line, set_ids[key]])
+        files[path] = ranges
+    return {
+        'version': INDEX_VERSION,
+        'commit': commit,
+        'tests': tests,
+        'unmapped': sorted(unmapped),
+        'sets': sets,
+        'files': files,
+    }
+
+
+def git_head(root):
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_diff(lines):
+    """`{path: [(start, end)]}` of old-side lines touched by a unified diff; None for whole-file changes"""
+    changes = {}
+    path = None
+    for line in lines:
+        if line.startswith('--- '):
+            old = line[4:].rstrip('\n')
+            path = None if old == '/dev/null' else old[2:] if old.startswith('a/') else old
+        elif line.startswith('+++ '):
+            new = line[4:].rstrip('\n')
+            if path is None and new != '/dev/null':
+                changes[new[2:] if new.startswith('b/') else new] = None  # new file
+            elif path is not None and new == '/dev/null':
+                changes[path] = None  # deleted file
+                path = None
+            elif path is not None:
+                changes.setdefault(path, [])
+        elif line.startswith('@@') and path is not None and changes.get(path) is not None:
+            match = _HUNK.match(line)
+            if match:
+                start = int(match.group(1))
+                count = 1 if match.group(2) is None else int(match.group(2))
+                # A pure insertion sits between old lines `start` and `start + 1`
+                changes[path].append((start, start + count - 1) if count else (max(start, 1), start + 1))
+        elif line.startswith('Binary files '):
+            parts = line.split(' and ')
+            if len(parts) == 2 and parts[1].startswith('b/'):
+                changes[parts[1][2:].split(' differ')[0]] = None
+    return changes
+
+
+def git_prefix(root):
+    """Path of `root` inside its git repository, with a trailing slash; '' at the top or without git"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--show-prefix'], cwd=root, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def relative_changes(changes, prefix):
+    """`changes` with repository-relative paths made relative to the project at `prefix`"""
+    if not prefix:
+        return changes
+    return {path[len(prefix):] if path.startswith(prefix) else path: ranges for path, ranges in changes.items()}
+
+
+def git_diff(root, base):
+    """Unified diff with no context of the working tree against `base`, paths relative to `root`"""
+    return subprocess.run(
+        ['git', 'diff', '-U0', '--no-color', '--no-ext-diff', '--no-renames', '--relative', base],
+        cwd=root, capture_output=True, text=True, check=True,
+    ).stdout.splitlines()
+
+
+class TestImpactIndex:
+    """Loaded index with range lookups per source file"""
+
+    def __init__(self, data):
+        self.tests = data['tests']
+        self.unmapped = data.get('unmapped', [])
+        self.sets = data['sets']
+        self.commit = data.get('commit')
+        self.files = data['files']
+        self.starts = {path: [r[0] for r in ranges] for path, ranges in self.files.items()}
+        self.by_path = {}
+        for i, test in enumerate(self.tests):
+            self.by_path.setdefault(split_test_id(test)[0], []).append(i)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"{path} has index version {data.get('version')}, expected {INDEX_VERSION}")
+        return cls(data)
+
+    def tests_on_lines(self, path, start, end):
+        """Test indices of the ranges overlapping `start..end`, or None if no instrumented range does"""
+        ranges = self.files[path]
+        found = None
+        k = bisect.bisect_right(self.starts[path], end) - 1
+        while k >= 0 and ranges[k][1] >= start:
+            found = (found or set()) | set(self.sets[ranges[k][2]])
+            k -= 1
+        return found
+
+    def tests_of_file(self, path):
+        """Every test that executes some line of `path`"""
+        return {i for _, _, set_id in self.files[path] for i in self.sets[set_id]}
+
+
+def select_tests(index, changes, root='.'):
+    """`(run_all, test ids, test files to run whole)` needed to check `changes`
+
+    Changes neither the index nor the import graph can place select the
+    whole suite, so an unexpected path never means running no tests.
+    """
+    run_all = True, list(index.tests), []
+    selected = set(index.unmapped)
+    unplaced = []
+    for path, ranges in changes.items():
+        if path in SUITE_WIDE or path.startswith(SUITE_WIDE_DIRS):
+            return run_all
+        if not path.endswith('.sol'):
+            name = path.rsplit('/', 1)[-1]
+            if name.endswith(CONFIG_SUFFIXES) or name.startswith('.env') or path.startswith(FIXTURE_DIRS):
+                return run_all
+            continue
+        if path in index.files and not path.endswith('.t.sol'):
+            if ranges is None:
+                selected |= index.tests_of_file(path)
+                continue
+            for start, end in ranges:
+                found = index.tests_on_lines(path, start, end)
+                # Declarations between functions change code the ranges do not show
+                selected |= index.tests_of_file(path) if found is None else found
+        else:
+            unplaced.append(path)  # tests run whole: new test functions are not in the index
+
+    whole_files = []
+    if unplaced:
+        root = Path(root)
+        graph = ImportGraph(root)
+        known = graph.files()
+        if any(path not in known and path not in index.by_path for path in unplaced):
+            return run_all
+        for path in graph.affected([str(root / path) for path in unplaced]):
+            if not path.endswith('.t.sol'):
+                continue
+            if path in index.by_path:
+                selected.update(index.by_path[path])
+            elif (root / path).exists():
+                whole_files.append(path)  # new test file, not in the index yet
+    return False, sorted(index.tests[i] for i in selected), sorted(whole_files)
+
+
+def cmd_build(args):
+    """Build the index from one coverage run per test"""
+    def progress(done, total, test, ok):
+        print(f"[{done}/{total}] {'ok' if ok else 'FAILED'} {test}", file=sys.stderr)
+
+    try:
+        index = build_index(args.root, args.jobs, args.forge, args.coverage_args.split(), progress=progress)
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        sys.exit(f"Could not list the tests: {e}")
+
+    index_file = Path(args.index or Path(args.root) / INDEX_FILE)
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = index_file.with_name(index_file.name + '.tmp')
+    tmp.write_text(json.dumps(index, separators=(',', ':')))
+    os.replace(tmp, index_file)
+    print(f"Indexed {len(index['tests'])} tests over {len(index['files'])} files "
+          f"({len(index['unmapped'])} without coverage, always selected) in {index_file}")
+    return 0
+
+
+def cmd_select(args):
+    """Print the tests affected by a diff"""
+    index_file = args.index or Path(args.root) / INDEX_FILE
+    try:
+        index = TestImpactIndex.load(index_file)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Could not load {index_file}: {e}")
+
+    try:
+        if args.diff == '-':
+            diff = sys.stdin.read().splitlines()
+        elif args.diff:
+            diff = Path(args.diff).read_text().splitlines()
+        else:
+            diff = git_diff(args.root, args.base or index.commit or 'origin/main')
+    except (OSError, subprocess.CalledProcessError) as e:
+        sys.exit(f"Could not read the diff: {e}")
+
+    changes = parse_diff(diff)
+    if args.diff:
+        # A plain `git diff` names files from the top of the repository
+        changes = relative_changes(changes, git_prefix(args.root))
+    run_all, tests, whole_files = select_tests(index, changes, args.root)
+    if args.format == 'json':
+        print(json.dumps({'all': run_all, 'tests': tests, 'files': whole_files}))
+    else:
+        print('\n'.join(whole_files + tests))
+    scope = 'the whole suite' if run_all else f"{len(tests)} of {len(index.tests)} tests"
+    extra = f" plus {len(whole_files)} new test files" if whole_files else ''
+    print(f"Selected {scope}{extra}", file=sys.stderr)
+    return 0
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Select the Foundry tests affected by a change")
+    parser.add_argument('--root', default='.', help="Foundry project root (default: cwd)")
+    parser.add_argument('--index', help=f"index file (default: {INDEX_FILE} under the root)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="run per-test coverage and write the index")
+    build.add_argument('--jobs', type=int, help="parallel coverage runs (default: CPU count)")
+    build.add_argument('--forge', default='forge', help="forge executable")
+    build.add_argument('--coverage-args', default='', help="extra forge coverage arguments, e.g. '--ir-minimum'")
+    build.set_defaults(func=cmd_build)
+
+    select = commands.add_parser('select', help="print the tests affected by a diff")
+    select.add_argument('--base', help="ref to diff against (default: the indexed commit)")
+    select.add_argument('--diff', metavar='PATH', help="read a unified diff from PATH ('-' for stdin) instead")
+    select.add_argument('--format', choices=['lines', 'json'], default='lines',
+                        help="lines: new test files, then path:Contract::test ids")
+    select.set_defaults(func=cmd_select)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,29 @@
 #!/usr/bin/env python3
 
 import argparse
-import copy
+import cProfile
+import hashlib
+import io
 import json
+import os
+import pstats
 import re
-import subprocess
+import struct
+import sys
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum as PyEnum
 from pathlib import Path
-from typing import Callable
-from urllib import request
+from typing import Callable, TextIO
+from urllib import error, request
 
 VoidFn = Callable[[], None]
 
 CHEATCODES_JSON_URL = "https://raw.githubusercontent.com/foundry-rs/foundry/master/crates/cheatcodes/assets/cheatcodes.json"
 OUT_PATH = "src/Vm.sol"
+MAX_LINE_LENGTH = 120
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "forge-std" / "vm.py"
+PROFILE_TOP = 25
 
 VM_SAFE_DOC = """\
 /// The `VmSafe` interface does not allow manipulation of the EVM state or other actions that may
@@ -36,38 +46,222 @@ def main():
             dest="path",
             required=False,
             help="path to a json file containing the Vm interface, as generated by Foundry")
+    parser.add_argument(
+            "--url",
+            default=CHEATCODES_JSON_URL,
+            help="URL to download the cheatcodes json from when --from is not given")
+    parser.add_argument(
+            "--cache-dir",
+            metavar="PATH",
+            type=Path,
+            default=CACHE_DIR,
+            help="directory of the downloaded cheatcodes json cache")
+    parser.add_argument(
+            "--offline",
+            action="store_true",
+            help="never access the network, only use the cached cheatcodes json")
+    parser.add_argument(
+            "--force",
+            action="store_true",
+            help="regenerate even if the input and generator are unchanged")
+    parser.add_argument(
+            "--target",
+            metavar="KIND=PATH[@PRAGMA]",
+            dest="targets",
+            type=Target.parse,
+            action="append",
+            help=f"output to generate, may be repeated. KIND is one of {', '.join(Target.KINDS)}; "
+            f"PRAGMA overrides the solidity version requirement of interface targets (default: {OUT_PATH})")
+    parser.add_argument(
+            "--selector-table",
+            metavar="PATH",
+            type=Path,
+            help="also write a sorted, binary-searchable selector to signature table")
+    parser.add_argument(
+            "--profile",
+            metavar="DIR",
+            type=Path,
+            help="write cProfile stats and a hot function and memory report of the run to DIR")
     args = parser.parse_args()
-    json_str = request.urlopen(CHEATCODES_JSON_URL).read().decode("utf-8") if args.path is None else Path(args.path).read_text()
-    contract = Cheatcodes.from_json(json_str)
+    if args.profile is None:
+        generate(args)
+    else:
+        run_profiled(args.profile, lambda: generate(args))
+
+
+def generate(args: argparse.Namespace):
+    targets = args.targets or [Target("vm", Path(OUT_PATH))]
+    if args.selector_table is not None:
+        targets.append(Target("table", args.selector_table))
+
+    if args.path is None:
+        json_str = JsonCache(args.cache_dir).fetch(args.url, offline=args.offline)
+    else:
+        json_str = Path(args.path).read_text()
+
+    digest = generator_digest(json_str)
+    stale = []
+    for target in targets:
+        if args.force or not Stamp(args.cache_dir, target.path).is_current(target.digest(digest)):
+            stale.append(target)
+        else:
+            print(f"{target.path} is up to date")
+    if not stale:
+        return
 
-    ccs = contract.cheatcodes
-    ccs = list(filter(lambda cc: cc.status not in ["experimental", "internal"], ccs))
-    ccs.sort(key=lambda cc: cc.func.id)
+    contract = Cheatcodes.from_json(json_str)
 
-    safe = list(filter(lambda cc: cc.safety == "safe", ccs))
-    safe.sort(key=CmpCheatcode)
-    unsafe = list(filter(lambda cc: cc.safety == "unsafe", ccs))
-    unsafe.sort(key=CmpCheatcode)
-    assert len(safe) + len(unsafe) == len(ccs)
+    index = SelectorIndex(contract.cheatcodes)
+    problems = index.problems()
+    if problems:
+        sys.exit("error: invalid cheatcodes json:\n" + "\n".join(problems))
+
+    safe, unsafe = split_cheatcodes(contract.cheatcodes)
+    model = Model(contract, index, safe, unsafe)
+
+    def emit(target: Target) -> Target:
+        target.emit(model)
+        return target
+
+    # Every target only reads the shared model, so they can be written concurrently. cProfile
+    # only sees the main thread, so profiled runs write them serially.
+    with ThreadPoolExecutor() as pool:
+        for target in map(emit, stale) if args.profile else pool.map(emit, stale):
+            Stamp(args.cache_dir, target.path).record(target.digest(digest))
+            print(f"Wrote to {target.path}")
+
+
+# Runs `f` under cProfile and tracemalloc and writes `vm.prof` and `vm-profile.txt` (the
+# hottest functions, peak memory and the largest allocation sites) to `directory`. Stdout is
+# left to `f`.
+def run_profiled(directory: Path, f: VoidFn, top: int = PROFILE_TOP):
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    try:
+        profile.runcall(f)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        directory.mkdir(parents=True, exist_ok=True)
+        profile.dump_stats(directory / "vm.prof")
+        report = io.StringIO()
+        for sort_key in ("tottime", "cumulative"):
+            report.write(f"Top {top} functions by {sort_key}\n")
+            pstats.Stats(profile, stream=report).strip_dirs().sort_stats(sort_key).print_stats(top)
+        report.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n\n")
+        report.write(f"Top {top} allocation sites still held at exit\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            report.write(f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} blocks  {frame.filename}:{frame.lineno}\n")
+        (directory / "vm-profile.txt").write_text(report.getvalue())
+        print(f"Profile written to {directory}", file=sys.stderr)
+
+
+# Hash of everything the output depends on: the input json and this script, which holds
+# all printer settings.
+def generator_digest(json_str: str) -> str:
+    h = hashlib.sha256()
+    h.update(Path(__file__).read_bytes())
+    h.update(json_str.encode("utf-8"))
+    return h.hexdigest()
+
+
+# The parsed cheatcodes shared by all targets of one run.
+class Model:
+    __slots__ = ("contract", "index", "safe", "unsafe")
+
+    contract: "Cheatcodes"
+    index: "SelectorIndex"
+    safe: list["Cheatcode"]
+    unsafe: list["Cheatcode"]
+
+    def __init__(self, contract: "Cheatcodes", index: "SelectorIndex", safe: list["Cheatcode"], unsafe: list["Cheatcode"]):
+        self.contract = contract
+        self.index = index
+        self.safe = safe
+        self.unsafe = unsafe
+
+
+# One output of a run: the `Vm.sol` interfaces, the `VmSafe` interface alone, the ABI of
+# `Vm` as JSON, a JSON selector manifest, or a binary `SelectorTable`.
+class Target:
+    __slots__ = ("kind", "path", "pragma")
+
+    KINDS = ("vm", "vm-safe", "abi", "selectors", "table")
+
+    kind: str
+    path: Path
+    pragma: str
+
+    def __init__(self, kind: str, path: Path, pragma: str = ">=0.6.2 <0.9.0"):
+        assert kind in self.KINDS, f"unknown target kind {kind!r}"
+        self.kind = kind
+        self.path = path
+        self.pragma = pragma
 
-    prefix_with_group_headers(safe)
-    prefix_with_group_headers(unsafe)
+    @staticmethod
+    def parse(spec: str) -> "Target":
+        kind, sep, rest = spec.partition("=")
+        if not sep or kind not in Target.KINDS:
+            raise argparse.ArgumentTypeError(f"expected KIND=PATH[@PRAGMA] with KIND one of {', '.join(Target.KINDS)}")
+        path, sep, pragma = rest.partition("@")
+        if sep:
+            return Target(kind, Path(path), pragma)
+        return Target(kind, Path(path))
+
+    def digest(self, generator_digest: str) -> str:
+        return hashlib.sha256(f"{generator_digest}\0{self.kind}\0{self.pragma}".encode("utf-8")).hexdigest()
+
+    def emit(self, model: Model):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.kind in ("vm", "vm-safe"):
+            safe = with_group_headers(model.safe)
+            unsafe = with_group_headers(model.unsafe) if self.kind == "vm" else None
+            # Stream into a temporary file so a failure never leaves a truncated Vm.sol behind
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            try:
+                with open(tmp, "w") as f:
+                    out = LineRewriter(f, lambda line: fmt_function(memory_to_calldata(line)))
+                    write_vm(out, model.contract, safe, unsafe, self.pragma)
+                    out.write("\n")
+                    out.flush()
+                os.replace(tmp, self.path)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+        elif self.kind == "abi":
+            abi = contract_abi(model.contract, model.safe + model.unsafe)
+            _write_atomic(self.path, (json.dumps(abi, indent=2, sort_keys=True) + "\n").encode("utf-8"))
+        elif self.kind == "selectors":
+            manifest = selector_manifest(model.index)
+            _write_atomic(self.path, (json.dumps(manifest, indent=2) + "\n").encode("utf-8"))
+        else:
+            _write_atomic(self.path, model.index.to_table())
 
-    out = ""
 
-    out += "// Automatically @generated by scripts/vm.py. Do not modify manually.\n\n"
+def write_vm(
+    out: TextIO,
+    contract: "Cheatcodes",
+    safe: list["Cheatcode | GroupHeader"],
+    unsafe: list["Cheatcode | GroupHeader"] | None,
+    solidity_requirement: str = ">=0.6.2 <0.9.0",
+):
+    out.write("// Automatically @generated by scripts/vm.py. Do not modify manually.\n\n")
 
     pp = CheatcodesPrinter(
+        writer=out,
         spdx_identifier="MIT OR Apache-2.0",
-        solidity_requirement=">=0.6.2 <0.9.0",
+        solidity_requirement=solidity_requirement,
         abicoder_pragma=True,
     )
     pp.p_prelude()
     pp.prelude = False
-    out += pp.finish()
+    pp.finish()
 
-    out += "\n\n"
-    out += VM_SAFE_DOC
+    out.write("\n\n")
+    out.write(VM_SAFE_DOC)
     vm_safe = Cheatcodes(
         # TODO: Custom errors were introduced in 0.8.4
         errors=[],  # contract.errors
@@ -77,10 +271,13 @@ def main():
         cheatcodes=safe,
     )
     pp.p_contract(vm_safe, "VmSafe")
-    out += pp.finish()
+    pp.finish()
+
+    if unsafe is None:
+        return
 
-    out += "\n\n"
-    out += VM_DOC
+    out.write("\n\n")
+    out.write(VM_DOC)
     vm_unsafe = Cheatcodes(
         errors=[],
         events=[],
@@ -89,66 +286,260 @@ def main():
         cheatcodes=unsafe,
     )
     pp.p_contract(vm_unsafe, "Vm", "VmSafe")
-    out += pp.finish()
-
-    # Compatibility with <0.8.0
-    def memory_to_calldata(m: re.Match) -> str:
-        return " calldata " + m.group(1)
-
-    out = re.sub(r" memory (.*returns)", memory_to_calldata, out)
-
-    with open(OUT_PATH, "w") as f:
-        f.write(out)
-
-    forge_fmt = ["forge", "fmt", OUT_PATH]
-    res = subprocess.run(forge_fmt)
-    assert res.returncode == 0, f"command failed: {forge_fmt}"
-
-    print(f"Wrote to {OUT_PATH}")
-
-
-class CmpCheatcode:
-    cheatcode: "Cheatcode"
-
-    def __init__(self, cheatcode: "Cheatcode"):
-        self.cheatcode = cheatcode
-
-    def __lt__(self, other: "CmpCheatcode") -> bool:
-        return cmp_cheatcode(self.cheatcode, other.cheatcode) < 0
+    pp.finish()
+
+
+# Compatibility with <0.8.0
+MEMORY_RETURNS_RE = re.compile(r" memory (.*returns)")
+
+
+def memory_to_calldata(line: str) -> str:
+    return MEMORY_RETURNS_RE.sub(lambda m: " calldata " + m.group(1), line)
+
+
+# Wraps a function declaration longer than `MAX_LINE_LENGTH` the way `forge fmt` does:
+# attributes on their own lines if the name and parameters fit on the first line,
+# otherwise one parameter per line followed by the attributes on the closing line.
+def fmt_function(line: str) -> str:
+    # `forge fmt` keeps a declaration on one line only if it leaves two columns free
+    if len(line) <= MAX_LINE_LENGTH - 2:
+        return line
+    decl = line.lstrip()
+    if not decl.startswith("function ") or not decl.endswith(";"):
+        return line
+    indent = line[: len(line) - len(decl)]
+    inner = indent + "    "
+
+    open_paren = decl.index("(")
+    close_paren = _find_closing_paren(decl, open_paren)
+    head = decl[: close_paren + 1]
+    attrs = _split_attributes(decl[close_paren + 1 : -1])
+    if not attrs:
+        return line
+
+    if len(indent) + len(head) <= MAX_LINE_LENGTH:
+        lines = [indent + head]
+        lines += [inner + attr for attr in attrs]
+        lines[-1] += ";"
+        return "\n".join(lines)
+
+    params = _split_params(decl[open_paren + 1 : close_paren])
+    lines = [indent + decl[: open_paren + 1]]
+    lines += [inner + param + "," for param in params]
+    lines[-1] = lines[-1][:-1]
+    lines.append(indent + ") " + " ".join(attrs) + ";")
+    return "\n".join(lines)
+
+
+def _find_closing_paren(s: str, open_paren: int) -> int:
+    depth = 0
+    for i in range(open_paren, len(s)):
+        if s[i] == "(":
+            depth += 1
+        elif s[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError(f"unbalanced parentheses: {s}")
+
+
+def _split_params(s: str) -> list[str]:
+    params = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(s):
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "," and depth == 0:
+            params.append(s[start:i].strip())
+            start = i + 1
+    params.append(s[start:].strip())
+    return [p for p in params if p != ""]
+
+
+# `returns (...)` is kept together as a single attribute.
+def _split_attributes(s: str) -> list[str]:
+    s = s.strip()
+    returns = s.find("returns")
+    if returns == -1:
+        return s.split()
+    return s[:returns].split() + [s[returns:].strip()]
+
+
+# Applies `rewrite` to every complete line before passing it on to `writer`.
+class LineRewriter:
+    writer: TextIO
+    rewrite: Callable[[str], str]
+    _partial: list[str]
+
+    def __init__(self, writer: TextIO, rewrite: Callable[[str], str]):
+        self.writer = writer
+        self.rewrite = rewrite
+        self._partial = []
+
+    def write(self, txt: str):
+        if "\n" not in txt:
+            self._partial.append(txt)
+            return
+        lines = txt.split("\n")
+        self._partial.append(lines[0])
+        lines[0] = "".join(self._partial)
+        self._partial = [lines.pop()]
+        for line in lines:
+            self.writer.write(self.rewrite(line))
+            self.writer.write("\n")
+
+    def flush(self):
+        if self._partial:
+            self.writer.write(self.rewrite("".join(self._partial)))
+            self._partial = []
+        self.writer.flush()
+
+
+# Content-addressed cache of downloaded JSON documents. Bodies are stored under their
+# sha256, and `index.json` maps each URL to the hash and validators of its last response.
+class JsonCache:
+    dir: Path
+
+    def __init__(self, dir: Path):
+        self.dir = dir
+
+    def fetch(self, url: str, offline: bool = False) -> str:
+        entry = self._load_index().get(url)
+        cached = self._read_object(entry["sha256"]) if entry else None
+
+        if offline:
+            if cached is None:
+                sys.exit(f"error: --offline given but {url} is not cached in {self.dir}")
+            return cached
+
+        req = request.Request(url)
+        if cached is not None:
+            if entry.get("etag"):
+                req.add_header("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                req.add_header("If-Modified-Since", entry["last_modified"])
+
+        try:
+            with request.urlopen(req) as res:
+                body = res.read()
+                etag = res.headers.get("ETag")
+                last_modified = res.headers.get("Last-Modified")
+        except error.HTTPError as e:
+            if e.code == 304 and cached is not None:
+                return cached
+            raise
+        except error.URLError as e:
+            if cached is None:
+                raise
+            print(f"warning: could not revalidate {url} ({e.reason}), using cached copy", file=sys.stderr)
+            return cached
+
+        self._store(url, body, etag, last_modified)
+        return body.decode("utf-8")
+
+    def _index_path(self) -> Path:
+        return self.dir / "index.json"
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.dir / "objects" / f"{sha256}.json"
+
+    def _load_index(self) -> dict:
+        try:
+            return json.loads(self._index_path().read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _read_object(self, sha256: str) -> str | None:
+        try:
+            body = self._object_path(sha256).read_bytes()
+        except FileNotFoundError:
+            return None
+        if hashlib.sha256(body).hexdigest() != sha256:
+            return None
+        return body.decode("utf-8")
+
+    def _store(self, url: str, body: bytes, etag: str | None, last_modified: str | None):
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = self._object_path(sha256)
+        if not path.exists():
+            _write_atomic(path, body)
+
+        index = self._load_index()
+        index[url] = {"sha256": sha256, "etag": etag, "last_modified": last_modified}
+        _write_atomic(self._index_path(), json.dumps(index, indent=2).encode("utf-8"))
+
+
+# Records which generator digest produced the output file, and the hash of what was
+# written, so unchanged inputs can skip generation unless the output was edited since.
+class Stamp:
+    path: Path
+    out_path: Path
+
+    def __init__(self, cache_dir: Path, out_path: Path):
+        key = hashlib.sha256(str(out_path.resolve()).encode("utf-8")).hexdigest()
+        self.path = cache_dir / "stamps" / f"{key}.json"
+        self.out_path = out_path
+
+    def is_current(self, digest: str) -> bool:
+        try:
+            stamp = json.loads(self.path.read_text())
+            out = self.out_path.read_bytes()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        return stamp.get("input") == digest and stamp.get("output") == hashlib.sha256(out).hexdigest()
+
+    def record(self, digest: str):
+        out = hashlib.sha256(self.out_path.read_bytes()).hexdigest()
+        _write_atomic(self.path, json.dumps({"input": digest, "output": out}).encode("utf-8"))
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+# Filters out experimental and internal cheatcodes and splits the rest by safety in a
+# single pass, each half sorted by `cheatcode_sort_key`.
+def split_cheatcodes(cheats: list["Cheatcode"]) -> tuple[list["Cheatcode"], list["Cheatcode"]]:
+    by_safety: dict[str, list[Cheatcode]] = {"safe": [], "unsafe": []}
+    for cheat in cheats:
+        if cheat.status in ("experimental", "internal"):
+            continue
+        assert cheat.safety in by_safety, f"unknown safety {cheat.safety!r} for {cheat.func.id}"
+        by_safety[cheat.safety].append(cheat)
 
-    def __eq__(self, other: "CmpCheatcode") -> bool:
-        return cmp_cheatcode(self.cheatcode, other.cheatcode) == 0
+    for ccs in by_safety.values():
+        ccs.sort(key=cheatcode_sort_key)
+    return by_safety["safe"], by_safety["unsafe"]
 
-    def __gt__(self, other: "CmpCheatcode") -> bool:
-        return cmp_cheatcode(self.cheatcode, other.cheatcode) > 0
 
+def cheatcode_sort_key(cheat: "Cheatcode") -> tuple[str, str, str, str]:
+    return (cheat.group, cheat.status, cheat.safety, cheat.func.id)
 
-def cmp_cheatcode(a: "Cheatcode", b: "Cheatcode") -> int:
-    if a.group != b.group:
-        return -1 if a.group < b.group else 1
-    if a.status != b.status:
-        return -1 if a.status < b.status else 1
-    if a.safety != b.safety:
-        return -1 if a.safety < b.safety else 1
-    if a.func.id != b.func.id:
-        return -1 if a.func.id < b.func.id else 1
-    return 0
 
+# Marks the start of a group of cheatcodes; printed as a header comment.
+class GroupHeader:
+    group: str
 
-# HACK: A way to add group header comments without having to modify printer code
-def prefix_with_group_headers(cheats: list["Cheatcode"]):
-    s = set()
-    for i, cheat in enumerate(cheats):
-        if cheat.group in s:
-            continue
+    def __init__(self, group: str):
+        self.group = group
 
-        s.add(cheat.group)
 
-        c = copy.deepcopy(cheat)
-        c.func.description = ""
-        c.func.declaration = f"// ======== {group(c.group)} ========"
-        cheats.insert(i, c)
-    return cheats
+# Expects `cheats` to be sorted by group.
+def with_group_headers(cheats: list["Cheatcode"]) -> list["Cheatcode | GroupHeader"]:
+    out: list[Cheatcode | GroupHeader] = []
+    last = None
+    for cheat in cheats:
+        if cheat.group != last:
+            last = cheat.group
+            out.append(GroupHeader(cheat.group))
+        out.append(cheat)
+    return out
 
 
 def group(s: str) -> str:
@@ -179,34 +570,63 @@ class Mutability(PyEnum):
 
 
 class Function:
+    __slots__ = (
+        "id",
+        "description",
+        "declaration",
+        "_visibility",
+        "_mutability",
+        "signature",
+        "selector",
+        "_selector_bytes",
+    )
+
     id: str
     description: str
     declaration: str
-    visibility: Visibility
-    mutability: Mutability
     signature: str
     selector: str
-    selector_bytes: bytes
 
     def __init__(
         self,
         id: str,
         description: str,
         declaration: str,
-        visibility: Visibility,
-        mutability: Mutability,
+        visibility: Visibility | str,
+        mutability: Mutability | str,
         signature: str,
         selector: str,
-        selector_bytes: bytes,
+        selector_bytes: bytes | None = None,
     ):
         self.id = id
         self.description = description
         self.declaration = declaration
-        self.visibility = visibility
-        self.mutability = mutability
+        self._visibility = visibility
+        self._mutability = mutability
         self.signature = signature
         self.selector = selector
-        self.selector_bytes = selector_bytes
+        self._selector_bytes = selector_bytes
+
+    # The printer only needs the id, description and declaration; everything else is
+    # decoded on first access and kept.
+    @property
+    def visibility(self) -> Visibility:
+        if not isinstance(self._visibility, Visibility):
+            self._visibility = Visibility(self._visibility)
+        return self._visibility
+
+    @property
+    def mutability(self) -> Mutability:
+        if not isinstance(self._mutability, Mutability):
+            self._mutability = Mutability(self._mutability)
+        return self._mutability
+
+    # `selectorBytes` holds the same 4 bytes as the hex `selector`, so it is not loaded.
+    @property
+    def selector_bytes(self) -> bytes:
+        if self._selector_bytes is None:
+            self._selector_bytes = bytes.fromhex(self.selector[2:])
+        return self._selector_bytes
 
     @staticmethod
     def from_dict(d: dict) -> "Function":
@@ -214,15 +634,16 @@ class Function:
             d["id"],
             d["description"],
             d["declaration"],
-            Visibility(d["visibility"]),
-            Mutability(d["mutability"]),
+            d["visibility"],
+            d["mutability"],
             d["signature"],
             d["selector"],
-            bytes(d["selectorBytes"]),
         )
 
 
 class Cheatcode:
+    __slots__ = ("func", "group", "status", "safety")
+
     func: Function
     group: str
     status: str
@@ -236,15 +657,18 @@ class Cheatcode:
 
     @staticmethod
     def from_dict(d: dict) -> "Cheatcode":
+        status = d["status"]
         return Cheatcode(
             Function.from_dict(d["func"]),
-            str(d["group"]),
-            str(d["status"]),
-            str(d["safety"]),
+            d["group"],
+            status if isinstance(status, str) else str(status),
+            d["safety"],
         )
 
 
 class Error:
+    __slots__ = ("name", "description", "declaration")
+
     name: str
     description: str
     declaration: str
@@ -260,6 +684,8 @@ class Error:
 
 
 class Event:
+    __slots__ = ("name", "description", "declaration")
+
     name: str
     description: str
     declaration: str
@@ -275,6 +701,8 @@ class Event:
 
 
 class EnumVariant:
+    __slots__ = ("name", "description")
+
     name: str
     description: str
 
@@ -284,6 +712,8 @@ class EnumVariant:
 
 
 class Enum:
+    __slots__ = ("name", "description", "variants")
+
     name: str
     description: str
     variants: list[EnumVariant]
@@ -298,11 +728,13 @@ class Enum:
         return Enum(
             d["name"],
             d["description"],
-            list(map(lambda v: EnumVariant(**v), d["variants"])),
+            [EnumVariant(**v) for v in d["variants"]],
         )
 
 
 class StructField:
+    __slots__ = ("name", "ty", "description")
+
     name: str
     ty: str
     description: str
@@ -314,6 +746,8 @@ class StructField:
 
 
 class Struct:
+    __slots__ = ("name", "description", "fields")
+
     name: str
     description: str
     fields: list[StructField]
@@ -328,11 +762,13 @@ class Struct:
         return Struct(
             d["name"],
             d["description"],
-            list(map(lambda f: StructField(**f), d["fields"])),
+            [StructField(**f) for f in d["fields"]],
         )
 
 
 class Cheatcodes:
+    __slots__ = ("errors", "events", "enums", "structs", "cheatcodes")
+
     errors: list[Error]
     events: list[Event]
     enums: list[Enum]
@@ -373,6 +809,194 @@ class Cheatcodes:
             return Cheatcodes.from_dict(json.load(f))
 
 
+# Hash indexes over cheatcode selectors, signatures and ids. Building the index records
+# every selector shared by more than one cheatcode and every repeated id.
+class SelectorIndex:
+    __slots__ = ("by_selector", "by_signature", "by_id", "collisions", "duplicate_ids")
+
+    by_selector: dict[str, Cheatcode]
+    by_signature: dict[str, str]
+    by_id: dict[str, Cheatcode]
+    collisions: dict[str, list[Cheatcode]]
+    duplicate_ids: dict[str, list[Cheatcode]]
+
+    def __init__(self, cheatcodes: list[Cheatcode]):
+        self.by_selector = {}
+        self.by_signature = {}
+        self.by_id = {}
+        self.collisions = {}
+        self.duplicate_ids = {}
+        for cheat in cheatcodes:
+            func = cheat.func
+            selector = func.selector.lower()
+            first = self.by_selector.setdefault(selector, cheat)
+            if first is not cheat:
+                self.collisions.setdefault(selector, [first]).append(cheat)
+            self.by_signature.setdefault(func.signature, selector)
+            first = self.by_id.setdefault(func.id, cheat)
+            if first is not cheat:
+                self.duplicate_ids.setdefault(func.id, [first]).append(cheat)
+
+    def lookup(self, selector: str | bytes | int) -> Cheatcode | None:
+        return self.by_selector.get(normalize_selector(selector))
+
+    def selector_of(self, signature: str) -> str | None:
+        return self.by_signature.get(signature)
+
+    def problems(self) -> list[str]:
+        problems = []
+        for selector, cheats in sorted(self.collisions.items()):
+            signatures = sorted({cheat.func.signature for cheat in cheats})
+            kind = "collision" if len(signatures) > 1 else "duplicate"
+            problems.append(f"selector {kind} {selector}: {', '.join(signatures)}")
+        for id, cheats in sorted(self.duplicate_ids.items()):
+            signatures = ", ".join(cheat.func.signature for cheat in cheats)
+            problems.append(f"duplicate id {id}: {signatures}")
+        return problems
+
+    # Serializes the index as a `SelectorTable`, sorted by selector.
+    def to_table(self) -> bytes:
+        rows = sorted((int(selector, 16), cheat.func.signature) for selector, cheat in self.by_selector.items())
+        records = bytearray()
+        blob = bytearray()
+        for selector, signature in rows:
+            sig = signature.encode("utf-8")
+            records += SelectorTable.RECORD.pack(selector, len(blob), len(sig))
+            blob += sig
+        return SelectorTable.MAGIC + SelectorTable.COUNT.pack(len(rows)) + bytes(records) + bytes(blob)
+
+
+# Read-only view of a serialized selector table: a magic, a record count, fixed-size
+# (selector, signature offset, signature length) records sorted by selector, and the
+# signatures. Lookups binary search the records without decoding the whole table.
+class SelectorTable:
+    MAGIC = b"VMSEL\x00\x00\x01"
+    COUNT = struct.Struct(">I")
+    RECORD = struct.Struct(">III")
+
+    data: bytes
+    count: int
+    _records: int
+    _blob: int
+
+    def __init__(self, data: bytes):
+        assert data[: len(self.MAGIC)] == self.MAGIC, "not a selector table"
+        self.data = data
+        (self.count,) = self.COUNT.unpack_from(data, len(self.MAGIC))
+        self._records = len(self.MAGIC) + self.COUNT.size
+        self._blob = self._records + self.count * self.RECORD.size
+
+    @staticmethod
+    def from_file(path: str | Path) -> "SelectorTable":
+        return SelectorTable(Path(path).read_bytes())
+
+    def lookup(self, selector: str | bytes | int) -> str | None:
+        target = int(normalize_selector(selector), 16)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            selector, offset, length = self.RECORD.unpack_from(self.data, self._records + mid * self.RECORD.size)
+            if selector < target:
+                lo = mid + 1
+            elif selector > target:
+                hi = mid
+            else:
+                start = self._blob + offset
+                return self.data[start : start + length].decode("utf-8")
+        return None
+
+
+# Every selector known to `index`, sorted, with the cheatcode it belongs to.
+def selector_manifest(index: SelectorIndex) -> list[dict]:
+    return [
+        {
+            "selector": selector,
+            "signature": cheat.func.signature,
+            "id": cheat.func.id,
+            "group": cheat.group,
+            "status": cheat.status,
+            "safety": cheat.safety,
+        }
+        for selector, cheat in sorted(index.by_selector.items())
+    ]
+
+
+# Builds the JSON ABI of the contract's events and the given cheatcodes from their
+# Solidity declarations, resolving struct and enum types against the contract.
+def contract_abi(contract: Cheatcodes, cheats: list[Cheatcode]) -> list[dict]:
+    structs = {struct.name: struct for struct in contract.structs}
+    enums = {enum.name for enum in contract.enums}
+    abi = [event_abi(event.declaration, structs, enums) for event in contract.events]
+    abi += [function_abi(cheat.func.declaration, structs, enums) for cheat in cheats]
+    return abi
+
+
+def function_abi(declaration: str, structs: dict[str, Struct], enums: set[str]) -> dict:
+    decl = declaration.strip().rstrip(";")
+    open_paren = decl.index("(")
+    close_paren = _find_closing_paren(decl, open_paren)
+    attrs = _split_attributes(decl[close_paren + 1 :])
+
+    outputs = []
+    if attrs and attrs[-1].startswith("returns"):
+        returns = attrs.pop()
+        ret_open = returns.index("(")
+        ret_close = _find_closing_paren(returns, ret_open)
+        outputs = [param_abi(p, structs, enums) for p in _split_params(returns[ret_open + 1 : ret_close])]
+
+    return {
+        "type": "function",
+        "name": decl[len("function ") : open_paren].strip(),
+        "inputs": [param_abi(p, structs, enums) for p in _split_params(decl[open_paren + 1 : close_paren])],
+        "outputs": outputs,
+        "stateMutability": next((a for a in attrs if a in ("pure", "view", "payable")), "nonpayable"),
+    }
+
+
+def event_abi(declaration: str, structs: dict[str, Struct], enums: set[str]) -> dict:
+    decl = declaration.strip().rstrip(";")
+    open_paren = decl.index("(")
+    close_paren = _find_closing_paren(decl, open_paren)
+    return {
+        "type": "event",
+        "name": decl[len("event ") : open_paren].strip(),
+        "inputs": [param_abi(p, structs, enums, event=True) for p in _split_params(decl[open_paren + 1 : close_paren])],
+        "anonymous": decl[close_paren + 1 :].strip() == "anonymous",
+    }
+
+
+def param_abi(param: str, structs: dict[str, Struct], enums: set[str], event: bool = False) -> dict:
+    ty, *rest = param.split()
+    names = [w for w in rest if w not in ("memory", "calldata", "storage", "payable", "indexed")]
+    base, bracket, dims = ty.partition("[")
+    base = base.rsplit(".", 1)[-1]
+    suffix = bracket + dims
+
+    entry = {"name": names[0] if names else ""}
+    if base in structs:
+        entry["type"] = "tuple" + suffix
+        entry["components"] = [param_abi(f"{f.ty} {f.name}", structs, enums) for f in structs[base].fields]
+    elif base in enums:
+        entry["type"] = "uint8" + suffix
+    else:
+        entry["type"] = {"uint": "uint256", "int": "int256"}.get(base, base) + suffix
+    if event:
+        entry["indexed"] = "indexed" in rest
+    return entry
+
+
+# Accepts a selector as an int, raw bytes or hex string, including full calldata.
+def normalize_selector(selector: str | bytes | int) -> str:
+    if isinstance(selector, int):
+        return f"0x{selector:08x}"
+    if isinstance(selector, (bytes, bytearray)):
+        return "0x" + bytes(selector[:4]).hex()
+    selector = selector.lower()
+    if selector.startswith("0x"):
+        selector = selector[2:]
+    return "0x" + selector[:8]
+
+
 class Item(PyEnum):
     ERROR: str = "error"
     EVENT: str = "event"
@@ -407,7 +1031,9 @@ class ItemOrder:
 
 
 class CheatcodesPrinter:
-    buffer: str
+    writer: TextIO
+    _owns_writer: bool
+    _pending: list[str]
 
     prelude: bool
     spdx_identifier: str
@@ -426,6 +1052,7 @@ class CheatcodesPrinter:
     def __init__(
         self,
         buffer: str = "",
+        writer: TextIO | None = None,
         prelude: bool = True,
         spdx_identifier: str = "UNLICENSED",
         solidity_requirement: str = "",
@@ -441,7 +1068,10 @@ class CheatcodesPrinter:
         self.solidity_requirement = solidity_requirement
         self.abicoder_v2 = abicoder_pragma
         self.block_doc_style = block_doc_style
-        self.buffer = buffer
+        self._owns_writer = writer is None
+        self.writer = io.StringIO() if writer is None else writer
+        self._pending = []
+        self._p_str(buffer)
         self.indent_level = indent_level
         self.nl_str = nl_str
 
@@ -455,9 +1085,14 @@ class CheatcodesPrinter:
 
         self.items_order = items_order
 
+    # Ends the current chunk of output, dropping its trailing whitespace. Returns the
+    # chunk when printing to the internal buffer; external writers already have it.
     def finish(self) -> str:
-        ret = self.buffer.rstrip()
-        self.buffer = ""
+        self._pending = []
+        if not self._owns_writer:
+            return ""
+        ret = self.writer.getvalue()
+        self.writer = io.StringIO()
         return ret
 
     def p_contract(self, contract: Cheatcodes, name: str, inherits: str = ""):
@@ -476,6 +1111,7 @@ class CheatcodesPrinter:
         self._p_str("{")
         self._p_nl()
         self._with_indent(lambda: self._p_items(contract))
+        self._p_trim_blank_lines()
         self._p_str("}")
         self._p_nl()
 
@@ -515,7 +1151,8 @@ class CheatcodesPrinter:
 
     def p_errors(self, errors: list[Error]):
         for error in errors:
-            self._p_line(lambda: self.p_error(error))
+            self.p_error(error)
+            self._p_nl()
 
     def p_error(self, error: Error):
         self._p_comment(error.description, doc=True)
@@ -523,7 +1160,8 @@ class CheatcodesPrinter:
 
     def p_events(self, events: list[Event]):
         for event in events:
-            self._p_line(lambda: self.p_event(event))
+            self.p_event(event)
+            self._p_nl()
 
     def p_event(self, event: Event):
         self._p_comment(event.description, doc=True)
@@ -531,7 +1169,8 @@ class CheatcodesPrinter:
 
     def p_enums(self, enums: list[Enum]):
         for enum in enums:
-            self._p_line(lambda: self.p_enum(enum))
+            self.p_enum(enum)
+            self._p_nl()
 
     def p_enum(self, enum: Enum):
         self._p_comment(enum.description, doc=True)
@@ -541,7 +1180,6 @@ class CheatcodesPrinter:
 
     def p_enum_variants(self, variants: list[EnumVariant]):
         for i, variant in enumerate(variants):
-            self._p_indent()
             self._p_comment(variant.description)
 
             self._p_indent()
@@ -552,7 +1190,8 @@ class CheatcodesPrinter:
 
     def p_structs(self, structs: list[Struct]):
         for struct in structs:
-            self._p_line(lambda: self.p_struct(struct))
+            self.p_struct(struct)
+            self._p_nl()
 
     def p_struct(self, struct: Struct):
         self._p_comment(struct.description, doc=True)
@@ -562,15 +1201,22 @@ class CheatcodesPrinter:
 
     def p_struct_fields(self, fields: list[StructField]):
         for field in fields:
-            self._p_line(lambda: self.p_struct_field(field))
+            self.p_struct_field(field)
 
     def p_struct_field(self, field: StructField):
         self._p_comment(field.description)
-        self._p_indented(lambda: self._p_str(f"{field.ty} {field.name};"))
+        self._p_line(lambda: self._p_str(f"{field.ty} {field.name};"))
 
-    def p_functions(self, cheatcodes: list[Cheatcode]):
+    def p_functions(self, cheatcodes: list[Cheatcode | GroupHeader]):
         for cheatcode in cheatcodes:
-            self._p_line(lambda: self.p_function(cheatcode.func))
+            if isinstance(cheatcode, GroupHeader):
+                self.p_group_header(cheatcode)
+            else:
+                self.p_function(cheatcode.func)
+            self._p_nl()
+
+    def p_group_header(self, header: GroupHeader):
+        self._p_line(lambda: self._p_str(f"// ======== {group(header.group)} ========"))
 
     def p_function(self, func: Function):
         self._p_comment(func.description, doc=True)
@@ -583,6 +1229,7 @@ class CheatcodesPrinter:
 
         s = map(lambda line: line.lstrip(), s.split("\n"))
         if self.block_doc_style:
+            self._p_indent()
             self._p_str("/*")
             if doc:
                 self._p_str("*")
@@ -598,12 +1245,8 @@ class CheatcodesPrinter:
             self._p_str(" */")
             self._p_nl()
         else:
-            first_line = True
             for line in s:
-                if not first_line:
-                    self._p_indent()
-                first_line = False
-
+                self._p_indent()
                 if doc:
                     self._p_str("/// ")
                 else:
@@ -621,19 +1264,30 @@ class CheatcodesPrinter:
         f()
         self._p_nl()
 
-    def _p_indented(self, f: VoidFn):
-        self._p_indent()
-        f()
-
     def _p_indent(self):
-        for _ in range(self.indent_level):
-            self._p_str(self._indent_str)
+        self._p_str(self._indent_str * self.indent_level)
 
     def _p_nl(self):
         self._p_str(self.nl_str)
 
+    # Items are separated by blank lines, but `forge fmt` removes the one before a closing brace.
+    def _p_trim_blank_lines(self):
+        if self._pending:
+            self._pending = [self.nl_str]
+
+    # Trailing whitespace is held back until more text follows so that `finish` can
+    # drop it without the writer having to support truncation.
     def _p_str(self, txt: str):
-        self.buffer += txt
+        text = txt.rstrip()
+        if text == "":
+            self._pending.append(txt)
+            return
+        if self._pending:
+            self.writer.write("".join(self._pending))
+            self._pending = []
+        self.writer.write(text)
+        if len(text) != len(txt):
+            self._pending.append(txt[len(text):])
 
     def _inc_indent(self):
         self.indent_level += 1
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+import argparse
+import cProfile
+import io
+import json
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+import vm
+
+SCALES = [1, 10, 100]
+# Roughly the number of cheatcodes in foundry's cheatcodes.json
+BASE_SIZE = 900
+
+GROUPS = ["evm", "testing", "scripting", "filesystem", "environment", "string", "json", "toml", "utilities", "crypto"]
+STATUSES = ["stable", "stable", "stable", "stable", "experimental", "internal", {"deprecated": "replaced"}]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description="Benchmark the phases of vm.py on synthetic cheatcodes json of increasing size")
+    parser.add_argument(
+            "--from",
+            metavar="PATH",
+            dest="path",
+            help="cheatcodes json to scale up; by default a synthetic one of realistic size is used")
+    parser.add_argument(
+            "--scales",
+            metavar="N",
+            type=int,
+            nargs="+",
+            default=SCALES,
+            help=f"multiples of the base size to benchmark (default: {' '.join(map(str, SCALES))})")
+    parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="timing runs per scale, the fastest is reported")
+    parser.add_argument(
+            "--profile",
+            metavar="DIR",
+            type=Path,
+            help="also write a cProfile dump of one full run per scale to DIR")
+    parser.add_argument(
+            "--json",
+            metavar="PATH",
+            type=Path,
+            help="also write the results as json")
+    args = parser.parse_args()
+
+    base = json.loads(Path(args.path).read_text()) if args.path else synthetic_cheatcodes(BASE_SIZE)
+
+    results = []
+    for scale in args.scales:
+        json_str = json.dumps(scale_cheatcodes(base, scale))
+        times = time_phases(json_str, args.repeat)
+        peaks = trace_phases(json_str)
+        if args.profile is not None:
+            args.profile.mkdir(parents=True, exist_ok=True)
+            profile = cProfile.Profile()
+            profile.runcall(run_phases, json_str, lambda _name, f: f())
+            profile.dump_stats(args.profile / f"vm-{scale}x.prof")
+        results.append({
+            "scale": scale,
+            "cheatcodes": len(base["cheatcodes"]) * scale,
+            "input_bytes": len(json_str),
+            "phases": [{"name": name, "seconds": times[name], "peak_bytes": peaks[name]} for name in times],
+        })
+
+    print_results(results)
+    if args.json is not None:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+# Runs every phase of the generator in order, passing each one to `run` as a named thunk.
+def run_phases(json_str: str, run: Callable[[str, Callable[[], Any]], Any]):
+    contract = run("load", lambda: vm.Cheatcodes.from_json(json_str))
+    safe, unsafe = run("filter/sort", lambda: vm.split_cheatcodes(contract.cheatcodes))
+    safe, unsafe = run("group headers", lambda: (vm.with_group_headers(safe), vm.with_group_headers(unsafe)))
+
+    def print_vm() -> str:
+        out = io.StringIO()
+        vm.write_vm(out, contract, safe, unsafe)
+        return out.getvalue()
+
+    printed = run("print", print_vm)
+
+    def rewrite(f: Callable[[str], str], text: str) -> str:
+        out = io.StringIO()
+        rewriter = vm.LineRewriter(out, f)
+        rewriter.write(text)
+        rewriter.flush()
+        return out.getvalue()
+
+    rewritten = run("memory to calldata", lambda: rewrite(vm.memory_to_calldata, printed))
+    run("format", lambda: rewrite(vm.fmt_function, rewritten))
+
+
+def time_phases(json_str: str, repeat: int) -> dict[str, float]:
+    best: dict[str, float] = {}
+
+    def timed(name: str, f: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        ret = f()
+        elapsed = time.perf_counter() - start
+        best[name] = min(best.get(name, elapsed), elapsed)
+        return ret
+
+    for _ in range(repeat):
+        run_phases(json_str, timed)
+    return best
+
+
+# Peak traced memory of each phase, measured in a separate run since tracing distorts timings.
+def trace_phases(json_str: str) -> dict[str, int]:
+    peaks: dict[str, int] = {}
+
+    def traced(name: str, f: Callable[[], Any]) -> Any:
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        ret = f()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[name] = peak - start
+        return ret
+
+    tracemalloc.start()
+    try:
+        run_phases(json_str, traced)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def print_results(results: list[dict]):
+    print(f"{'scale':>6} {'cheatcodes':>10} {'phase':<20} {'time (ms)':>10} {'peak (KiB)':>11}")
+    for result in results:
+        for i, phase in enumerate(result["phases"]):
+            scale = f"{result['scale']}x" if i == 0 else ""
+            count = str(result["cheatcodes"]) if i == 0 else ""
+            print(
+                f"{scale:>6} {count:>10} {phase['name']:<20} "
+                f"{phase['seconds'] * 1000:>10.2f} {phase['peak_bytes'] / 1024:>11.1f}"
+            )
+        total = sum(phase["seconds"] for phase in result["phases"])
+        print(f"{'':>6} {'':>10} {'total':<20} {total * 1000:>10.2f}")
+
+
+# Repeats the cheatcodes of `base` `scale` times under fresh names and unique selectors.
+def scale_cheatcodes(base: dict, scale: int) -> dict:
+    cheatcodes = []
+    n = 0
+    for rep in range(scale):
+        for cheat in base["cheatcodes"]:
+            func = cheat["func"]
+            name = func["declaration"].split("(", 1)[0].split()[-1]
+            suffix = f"_{rep}" if rep > 0 else ""
+            selector = n.to_bytes(4, "big")
+            n += 1
+            cheatcodes.append({
+                **cheat,
+                "func": {
+                    **func,
+                    "id": func["id"] + suffix,
+                    "declaration": func["declaration"].replace(f" {name}(", f" {name}{suffix}(", 1),
+                    "signature": func["signature"].replace(f"{name}(", f"{name}{suffix}(", 1),
+                    "selector": "0x" + selector.hex(),
+                    "selectorBytes": list(selector),
+                },
+            })
+    return {**base, "cheatcodes": cheatcodes}
+
+
+def synthetic_cheatcodes(n: int) -> dict:
+    rng = random.Random(0)
+    cheatcodes = []
+    for i in range(n):
+        name = f"cheat{i}"
+        mutability = rng.choice(["pure", "view", ""])
+        params = ", ".join(f"{rng.choice(['string memory', 'bytes memory', 'uint256', 'address'])} arg{j}" for j in range(rng.randint(0, 5)))
+        returns = rng.choice(["", " returns (bytes memory data)", " returns (uint256 value)"])
+        declaration = f"function {name}({params}) external{' ' + mutability if mutability else ''}{returns};"
+        description = "\n".join(f"Line {j} describing `{name}` in some detail." for j in range(rng.randint(0, 3)))
+        cheatcodes.append({
+            "func": {
+                "id": name,
+                "description": description,
+                "declaration": declaration,
+                "visibility": "external",
+                "mutability": mutability,
+                "signature": f"{name}()",
+                "selector": "0x00000000",
+                "selectorBytes": [0, 0, 0, 0],
+            },
+            "group": rng.choice(GROUPS),
+            "status": rng.choice(STATUSES),
+            "safety": rng.choice(["safe", "unsafe"]),
+        })
+    return {
+        "errors": [],
+        "events": [],
+        "enums": [{"name": "Mode", "description": "A mode.", "variants": [{"name": "None", "description": "No mode."}]}],
+        "structs": [
+            {
+                "name": "Log",
+                "description": "A log.",
+                "fields": [{"name": "topics", "ty": "bytes32[]", "description": "The topics."}],
+            }
+        ],
+        "cheatcodes": cheatcodes,
+    }
+
+
+if __name__ == "__main__":
+    main()